@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        import api.authentication  # noqa: F401
+        import api.autocomplete  # noqa: F401
+        import api.caching  # noqa: F401
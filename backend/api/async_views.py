@@ -0,0 +1,246 @@
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, NotAuthenticated, NotFound
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import exception_handler
+
+from api.caching import (
+    cache_entry, cache_path, conditional_response, response_key
+)
+from api.serializers import SubscriptionSerializer
+from api.views import (
+    CustomUserViewSet, IngredientViewSet, RecipeViewSet, TagViewSet
+)
+
+MEDIA_TYPE = JSONRenderer.media_type
+READ_METHODS = ('GET', 'HEAD')
+# Заголовки ответа с ошибкой, которые выставляет обработчик DRF.
+ERROR_HEADERS = ('WWW-Authenticate', 'Retry-After')
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status, content_type=MEDIA_TYPE
+    )
+
+
+def error_response(request, exc):
+    """Ответ с ошибкой в том же виде, что у представлений DRF."""
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        authenticators = request.authenticators
+        auth_header = (
+            authenticators[0].authenticate_header(request)
+            if authenticators else None
+        )
+        if auth_header:
+            exc.auth_header = auth_header
+        else:
+            exc.status_code = 403
+    response = exception_handler(exc, {'request': request})
+    if response is None:
+        raise exc
+    result = json_response(response.data, response.status_code)
+    for header in ERROR_HEADERS:
+        if header in response:
+            result[header] = response[header]
+    return result
+
+
+def async_read(view):
+    """
+    Асинхронный обработчик чтения: аутентификация DRF, ошибки DRF,
+    ответ в JSON.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request = Request(request, authenticators=[
+            authenticator()
+            for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ])
+        try:
+            # Токен может проверяться по базе.
+            await sync_to_async(getattr)(request, 'user')
+            return await view(request, *args, **kwargs)
+        except (APIException, Http404) as exc:
+            return error_response(request, exc)
+
+    return wrapper
+
+
+def read_path(async_view, sync_view, sync_params=()):
+    """
+    GET и HEAD обслуживает асинхронное представление, остальные методы,
+    браузерный API и параметры из sync_params - синхронное DRF.
+    """
+    sync_params = {api_settings.URL_FORMAT_OVERRIDE, *sync_params}
+
+    async def view(request, *args, **kwargs):
+        if (
+            request.method in READ_METHODS
+            and not sync_params & request.GET.keys()
+            and 'text/html' not in request.headers.get('Accept', '')
+        ):
+            return await async_view(request, *args, **kwargs)
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+    # csrf_exempt в Django 4.2 не умеет оборачивать корутины.
+    view.csrf_exempt = True
+    return view
+
+
+def make_view(viewset_class, request, action, **kwargs):
+    """Экземпляр вьюсета, как его готовит DRF перед вызовом действия."""
+    handler = getattr(viewset_class, action)
+    return viewset_class(
+        **getattr(handler, 'kwargs', {}),
+        request=request,
+        action=action,
+        args=(),
+        kwargs=kwargs,
+        format_kwarg=None,
+    )
+
+
+async def filtered_queryset(view):
+    # Фильтры проверяют часть значений по базе (слаги тегов),
+    # поэтому queryset собирается в потоке.
+    return await sync_to_async(view.filter_queryset)(view.get_queryset())
+
+
+async def paginate(request, queryset, paginator):
+    """
+    Страница как у PageNumberPagination: COUNT и выборка через
+    асинхронный ORM. Возвращает объекты и count/next/previous.
+    """
+    page_size = paginator.get_page_size(request)
+    number = request.query_params.get(paginator.page_query_param, 1)
+    count = await queryset.acount()
+    pages = max(1, math.ceil(count / page_size))
+    if number in paginator.last_page_strings:
+        number = pages
+    try:
+        number = int(number)
+    except ValueError:
+        number = 0
+    if not 1 <= number <= pages:
+        raise NotFound(paginator.invalid_page_message)
+    offset = (number - 1) * page_size
+    objects = [
+        obj async for obj in queryset[offset:offset + page_size]
+    ]
+    url = request.build_absolute_uri()
+    if number == 1:
+        previous_url = None
+    elif number == 2:
+        previous_url = remove_query_param(url, paginator.page_query_param)
+    else:
+        previous_url = replace_query_param(
+            url, paginator.page_query_param, number - 1
+        )
+    return objects, {
+        'count': count,
+        'next': replace_query_param(
+            url, paginator.page_query_param, number + 1
+        ) if number < pages else None,
+        'previous': previous_url,
+    }
+
+
+async def list_data(viewset_class, request):
+    view = make_view(viewset_class, request, 'list')
+    view.check_permissions(request)
+    queryset = await filtered_queryset(view)
+    if view.paginator is None:
+        objects = [obj async for obj in queryset.aiterator()]
+        return view.get_serializer(objects, many=True).data
+    objects, page = await paginate(request, queryset, view.paginator)
+    return {**page, 'results': view.get_serializer(objects, many=True).data}
+
+
+async def detail_data(viewset_class, request, **kwargs):
+    view = make_view(viewset_class, request, 'retrieve', **kwargs)
+    view.check_permissions(request)
+    queryset = await filtered_queryset(view)
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    try:
+        instance = await queryset.aget(
+            **{view.lookup_field: kwargs[lookup_url_kwarg]}
+        )
+    except queryset.model.DoesNotExist:
+        raise Http404
+    view.check_object_permissions(request, instance)
+    return view.get_serializer(instance).data
+
+
+async def reference_response(request, viewset_class, load, **kwargs):
+    """Ответ справочника из общего с ReferenceCacheMixin кэша."""
+    key = await sync_to_async(response_key)(
+        viewset_class.queryset.model,
+        MEDIA_TYPE,
+        cache_path(request, viewset_class.cache_query_params),
+    )
+    cached = await cache.aget(key)
+    if cached is None:
+        data = await load(viewset_class, request, **kwargs)
+        cached = cache_entry(JSONRenderer().render(data), MEDIA_TYPE)
+        await cache.aset(key, cached, settings.REFERENCE_CACHE_TTL)
+    return conditional_response(request, cached)
+
+
+@async_read
+async def recipe_list(request):
+    return json_response(await list_data(RecipeViewSet, request))
+
+
+@async_read
+async def recipe_detail(request, pk):
+    return json_response(await detail_data(RecipeViewSet, request, pk=pk))
+
+
+@async_read
+async def tag_list(request):
+    return await reference_response(request, TagViewSet, list_data)
+
+
+@async_read
+async def tag_detail(request, pk):
+    return await reference_response(request, TagViewSet, detail_data, pk=pk)
+
+
+@async_read
+async def ingredient_list(request):
+    return await reference_response(request, IngredientViewSet, list_data)
+
+
+@async_read
+async def ingredient_detail(request, pk):
+    return await reference_response(
+        request, IngredientViewSet, detail_data, pk=pk
+    )
+
+
+@async_read
+async def subscriptions(request):
+    view = make_view(CustomUserViewSet, request, 'subscriptions')
+    view.check_permissions(request)
+    recipes_limit = view.get_recipes_limit()
+    authors, page = await paginate(
+        request, view.get_subscriptions(recipes_limit), view.paginator
+    )
+    serializer = SubscriptionSerializer(
+        authors, many=True, context={
+            'request': request, 'recipes_limit': recipes_limit
+        }
+    )
+    return json_response({**page, 'results': serializer.data})
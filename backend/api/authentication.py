@@ -0,0 +1,147 @@
+import copy
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import auth_fields_updated
+
+SHARED_KEY = 'api:auth-token:{digest}'
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш ограниченного размера со сроком жизни."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+local_cache = TTLCache(
+    settings.TOKEN_AUTH_CACHE['MAX_SIZE'], settings.TOKEN_AUTH_CACHE['TTL']
+)
+
+
+def shared_key(key):
+    # В общий кэш токен попадает только в виде хэша.
+    return SHARED_KEY.format(digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_token(key):
+    if not settings.TOKEN_AUTH_CACHE['ENABLED']:
+        return
+    # Без общей записи локальные копии других процессов не используются.
+    local_cache.delete(key)
+    cache.delete(shared_key(key))
+
+
+def invalidate_users(user_ids):
+    if not settings.TOKEN_AUTH_CACHE['ENABLED']:
+        return
+    for key in Token.objects.filter(user_id__in=user_ids).values_list(
+        'key', flat=True
+    ):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication с кэшем пар токен - пользователь, включается
+    TOKEN_AUTH_CACHE['ENABLED']. Общий кэш Django хранит для токена
+    только id пользователя, is_active и версию записи; копия в памяти
+    процесса действует, пока её версия совпадает с общей, поэтому сброс
+    в одном процессе сразу виден всем. Записи сбрасываются при выходе,
+    сохранении, удалении пользователя и при изменении is_active и пароля
+    через QuerySet.update().
+    """
+
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_AUTH_CACHE['ENABLED']:
+            return super().authenticate_credentials(key)
+        token = self.get_shared(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            self.remember(key, token)
+        # Копия, чтобы изменения request.user не попадали в кэш.
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        if not token.user.is_active:
+            invalidate_token(key)
+            return super().authenticate_credentials(key)
+        return token.user, token
+
+    def get_shared(self, key):
+        entry = cache.get(shared_key(key))
+        if entry is None or not entry['is_active']:
+            return None
+        version, token = local_cache.get(key) or (None, None)
+        if token is None or version != entry['version']:
+            # Запись сделал другой процесс: пользователь - по id.
+            user = get_user_model().objects.filter(
+                pk=entry['user_id']
+            ).first()
+            if user is None:
+                return None
+            token = self.get_model()(key=key, user=user)
+            local_cache.set(key, (entry['version'], token))
+        return token
+
+    @staticmethod
+    def remember(key, token):
+        version = uuid.uuid4().hex
+        cache.set(shared_key(key), {
+            'user_id': token.user_id,
+            'is_active': token.user.is_active,
+            'version': version,
+        }, settings.TOKEN_AUTH_CACHE['TTL'])
+        local_cache.set(key, (version, token))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Смена пароля, деактивация и любое другое изменение пользователя."""
+    invalidate_users([instance.pk])
+
+
+@receiver(auth_fields_updated, sender=get_user_model())
+def invalidate_updated_users(sender, user_ids, **kwargs):
+    invalidate_users(user_ids)
@@ -0,0 +1,88 @@
+import bisect
+import threading
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Ingredient
+
+
+class IngredientPrefixIndex:
+    """
+    Отсортированный по названию индекс ингредиентов в памяти процесса.
+    Используется вместо индексов Postgres на других СУБД и сбрасывается
+    при любом изменении ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._ingredients = None
+
+    def clear(self):
+        with self._lock:
+            self._keys = self._ingredients = None
+
+    def _load(self):
+        with self._lock:
+            if self._keys is None:
+                ingredients = sorted(
+                    Ingredient.objects.all(),
+                    key=lambda ingredient: (
+                        ingredient.name.upper(), ingredient.id
+                    )
+                )
+                self._ingredients = ingredients
+                self._keys = [
+                    ingredient.name.upper() for ingredient in ingredients
+                ]
+            return self._keys, self._ingredients
+
+    def search(self, name, limit):
+        keys, ingredients = self._load()
+        name = name.upper()
+        start = bisect.bisect_left(keys, name)
+        result = []
+        for position in range(start, len(keys)):
+            if len(result) >= limit or not keys[position].startswith(name):
+                break
+            result.append(ingredients[position])
+        if len(result) < limit:
+            result.extend(
+                ingredient
+                for key, ingredient in zip(keys, ingredients)
+                if name in key and not key.startswith(name)
+            )
+        return result[:limit]
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def clear_ingredient_index(**kwargs):
+    ingredient_index.clear()
+
+
+def autocomplete_ingredients(name, limit):
+    """
+    Ингредиенты, название которых начинается с name или содержит его;
+    совпадения по началу названия идут первыми.
+    """
+    if connection.vendor != 'postgresql':
+        return ingredient_index.search(name, limit)
+    return list(autocomplete_queryset(name, limit))
+
+
+def autocomplete_queryset(name, limit):
+    """Запрос автодополнения для PostgreSQL (индекс pg_trgm)."""
+    return Ingredient.objects.filter(name__icontains=name).annotate(
+        rank=Case(
+            When(name__istartswith=name, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by('rank', 'name')[:limit]
@@ -0,0 +1,119 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag, urlencode
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+
+VERSION_KEY = 'api:reference-version:{label}'
+RESPONSE_KEY = 'api:reference:{label}:{version}:{media_type}:{path}'
+
+
+def get_version(model):
+    key = VERSION_KEY.format(label=model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns())
+        version = cache.get(key)
+    return version
+
+
+def cache_path(request, params):
+    """Путь и только те параметры запроса, от которых зависит ответ."""
+    return '{}?{}'.format(request.path, urlencode(sorted(
+        (name, value)
+        for name in params for value in request.GET.getlist(name)
+    )))
+
+
+def response_key(model, media_type, path):
+    return RESPONSE_KEY.format(
+        label=model._meta.label_lower,
+        version=get_version(model),
+        media_type=media_type,
+        path=path,
+    )
+
+
+def cache_entry(content, content_type):
+    """Запись кэша: тело, Content-Type и ETag ответа."""
+    return (
+        content,
+        content_type,
+        quote_etag(hashlib.md5(content).hexdigest()),
+    )
+
+
+def conditional_response(request, cached):
+    """Ответ из записи кэша или 304, если ETag клиента актуален."""
+    content, content_type, etag = cached
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (
+        {etag, '*'} & set(parse_etags(if_none_match))
+    ):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    return response
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_version(sender, **kwargs):
+    """Новая версия справочника делает старые ответы недоступными."""
+    cache.set(
+        VERSION_KEY.format(label=sender._meta.label_lower),
+        time.time_ns(),
+        None
+    )
+
+
+class ReferenceCacheMixin:
+    """
+    Кэширует отрендеренные в JSON ответы list/retrieve справочника
+    и отвечает 304 на If-None-Match с актуальным ETag.
+    Параметры запроса вне cache_query_params в ключ не попадают.
+    """
+
+    cache_query_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        # HTML браузерного API содержит имя пользователя и CSRF-токен,
+        # кэшируется только JSON, общий для всех.
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return handler(request, *args, **kwargs)
+        key = response_key(
+            self.queryset.model,
+            request.accepted_media_type,
+            cache_path(request, self.cache_query_params),
+        )
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            cached = cache_entry(
+                response.render().content, response['Content-Type']
+            )
+            cache.set(key, cached, settings.REFERENCE_CACHE_TTL)
+        return conditional_response(request, cached)
@@ -0,0 +1,101 @@
+import base64
+import binascii
+import re
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile, TemporaryUploadedFile
+)
+from rest_framework import serializers
+
+BASE64_HEADER = re.compile(r'data:image/(?P<type>[a-z]+);base64,')
+BASE64_HEADER_MAX_LENGTH = 32
+# Кратно 4, чтобы каждый кусок декодировался независимо.
+BASE64_CHUNK_SIZE = 64 * 1024
+IMAGE_TYPES = ('jpeg', 'jpg', 'png', 'gif', 'webp')
+
+
+class Base64ImageField(serializers.ImageField):
+    """
+    Изображение в base64 или файлом из multipart/form-data.
+    Base64 проверяется по заголовку и размеру до декодирования
+    и декодируется по частям во временный файл, как обычная загрузка.
+    """
+
+    default_error_messages = {
+        'image_type': 'Неподдерживаемый тип изображения.',
+        'image_size': 'Размер изображения больше {max_size} байт.',
+        'base64': 'Изображение в base64 повреждено.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:image'):
+            data = self.decode(data)
+        elif getattr(data, 'size', 0) > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('image_size', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        return super().to_internal_value(data)
+
+    def decode(self, data):
+        header = BASE64_HEADER.match(data, 0, BASE64_HEADER_MAX_LENGTH)
+        if header is None or header['type'] not in IMAGE_TYPES:
+            self.fail('image_type')
+        start = header.end()
+        padding = len(data) - len(data.rstrip('='))
+        size = (len(data) - start) * 3 // 4 - padding
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('image_size', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        name = f'image.{header["type"]}'
+        content_type = f'image/{header["type"]}'
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile(name, content_type, size, None)
+        else:
+            file = InMemoryUploadedFile(
+                BytesIO(), None, name, content_type, size, None
+            )
+        try:
+            for position in range(start, len(data), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    data[position:position + BASE64_CHUNK_SIZE],
+                    validate=True
+                ))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('base64')
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+
+def resolve_ids(queryset, ids):
+    """
+    Получить объекты по списку id одним запросом, сохранив порядок
+    и повторы; все отсутствующие id попадают в одну ошибку.
+    """
+    objects = queryset.in_bulk(set(ids))
+    missing = sorted({pk for pk in ids if pk not in objects})
+    if missing:
+        raise serializers.ValidationError(
+            f'Не найдены объекты с id: {", ".join(map(str, missing))}.'
+        )
+    return [objects[pk] for pk in ids]
+
+
+class BulkPrimaryKeyRelatedField(serializers.ListField):
+    """Список первичных ключей, который проверяется одним запросом."""
+
+    child = serializers.IntegerField(min_value=1)
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        # Длину проверяем до запроса, а не после, как делает ListField.
+        if self.max_length is not None and len(ids) > self.max_length:
+            self.fail('max_length', max_length=self.max_length)
+        return resolve_ids(self.queryset, ids)
+
+    def to_representation(self, value):
+        return [obj.pk for obj in value.all()]
@@ -1,7 +1,13 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, When
 from django_filters.rest_framework import CharFilter, FilterSet
 from django_filters.rest_framework import filters as djangofilters
+from rest_framework.exceptions import ValidationError
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import (
+    SEARCH_CONFIG, Ingredient, Recipe, RecipeIngredient, Tag
+)
 
 
 class IngredientFilter(FilterSet):
@@ -16,13 +22,27 @@ class RecipeFilter(FilterSet):
     tags = djangofilters.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
         field_name='tags__slug',
-        to_field_name='slug')
+        to_field_name='slug',
+        method='get_tags')
     is_favorited = djangofilters.NumberFilter(
         method='get_favorite_recipes'
     )
     is_in_shopping_cart = djangofilters.NumberFilter(
         method='get_is_in_shopping_cart'
     )
+    search = CharFilter(method='get_search')
+    ingredients = CharFilter(method='get_ingredients')
+
+    def get_tags(self, queryset, name, value):
+        """
+        Полусоединение через EXISTS вместо JOIN + DISTINCT: рецепты
+        не дублируются и сохраняется порядок по индексу pub_date.
+        """
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value
+        )))
 
     def get_favorite_recipes(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -38,11 +58,54 @@ class RecipeFilter(FilterSet):
             )
         return queryset
 
+    def get_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(
+                value, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank', '-pub_date')
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        ).annotate(
+            rank=Case(
+                When(name__icontains=value, then=1),
+                default=0,
+                output_field=IntegerField()
+            )
+        ).order_by('-rank', '-pub_date')
+
+    def get_ingredients(self, queryset, name, value):
+        """
+        Список id через запятую: рецепт содержит все указанные
+        ингредиенты и ни одного из отмеченных минусом (1,2,-3).
+        """
+        try:
+            ids = [int(item) for item in value.split(',') if item.strip()]
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'Укажите id ингредиентов через запятую.'}
+            )
+        for ingredient_id in ids:
+            contains = Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient_id=abs(ingredient_id)
+            ))
+            queryset = queryset.filter(
+                contains if ingredient_id > 0 else ~contains
+            )
+        return queryset
+
     class Meta:
         model = Recipe
         fields = (
             'tags',
             'author',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search',
+            'ingredients'
         )
@@ -0,0 +1,87 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('api.query_budget')
+
+
+class QueryCounter:
+    """Обёртка execute_wrapper: считает запросы и время в БД."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class QueryBudgetMiddleware:
+    """
+    Измеряет для каждого запроса число SQL-запросов, время в БД,
+    время рендеринга ответа (response.render(), для DRF - кодирование
+    в JSON), остальное время обработки и размер ответа. Отдаёт их
+    в Server-Timing и пишет в лог api.query_budget; запросы сверх
+    QUERY_BUDGET пишутся с уровнем WARNING. Работает и при DEBUG=False.
+    Сериализаторы DRF обычно работают в представлении, их время
+    входит в app.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        render = getattr(response, 'render_duration', 0.0)
+        app = total - counter.duration - render
+        size = None if response.streaming else len(response.content)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={counter.duration * 1000:.1f};'
+            f'desc="{counter.count} queries"',
+            f'render;dur={render * 1000:.1f}',
+            f'app;dur={app * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        over_budget = counter.count > settings.QUERY_BUDGET
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': counter.count,
+                'db_ms': round(counter.duration * 1000, 1),
+                'render_ms': round(render * 1000, 1),
+                'app_ms': round(app * 1000, 1),
+                'total_ms': round(total * 1000, 1),
+                'response_bytes': size,
+                'over_budget': over_budget,
+            })
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # Middleware стоит первым, поэтому этот хук вызывается последним,
+        # прямо перед response.render().
+        started = time.perf_counter()
+
+        def rendered(response):
+            response.render_duration = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
@@ -1,5 +1,48 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+    invalid_ordering_message = (
+        'Курсор работает только с порядком по дате публикации: '
+        'уберите ordering и search или используйте page.'
+    )
+
+    def get_ordering(self, request, queryset, view):
+        # Курсор построен по (pub_date, id). Другой порядок фильтров
+        # (?ordering=, ранжирование ?search=) он бы молча отбросил.
+        order_by = tuple(queryset.query.order_by)
+        if order_by != self.ordering[:len(order_by)]:
+            raise ValidationError(
+                {self.cursor_query_param: self.invalid_ordering_message}
+            )
+        return self.ordering
+
+
+class RecipePagination(CustomPagination):
+    """
+    Постраничная выдача рецептов. С параметром ?cursor= переключается
+    на курсорную: без COUNT(*) и OFFSET, по индексу (pub_date, id).
+    """
+
+    cursor_query_param = RecipeCursorPagination.cursor_query_param
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
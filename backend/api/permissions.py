@@ -18,7 +18,7 @@ class IsAuthorAdminOrReadOnly(permissions.BasePermission):
         return (
             request.method in permissions.SAFE_METHODS
             or request.user.is_authenticated and (
-                obj.author == request.user
+                obj.author_id == request.user.id
                 or request.user.is_staff
             )
         )
@@ -1,25 +1,24 @@
-import base64
-
-from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
+from api.fields import (
+    Base64ImageField, BulkPrimaryKeyRelatedField, resolve_ids
+)
+from api.utils import create_or_none
+from recipes.images import discard_renditions, schedule_recipe_image
 from recipes.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Tag
 )
+from recipes.signals import shopping_lists_updated_by_caller
 from users.models import CustomUser, Subscription
 
 MIN_AMOUNT = 1
 MAX_AMOUNT = 32000
-
-
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+MAX_BULK_RECIPES = 100
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -57,12 +56,14 @@ class CustomUserSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return user.subscribers.filter(author=obj).exists()
 
 
 class SubscriptionSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta(CustomUserSerializer.Meta):
         fields = CustomUserSerializer.Meta.fields + (
@@ -71,13 +72,17 @@ class SubscriptionSerializer(CustomUserSerializer):
         )
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
         recipes = obj.recipes.all()
-        recipes_limit = request.query_params.get('recipes_limit')
+        recipes_limit = self.context.get('recipes_limit')
         if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+            recipes = recipes[:recipes_limit]
         return RecipeMinifiedSerializer(recipes, many=True).data
 
+    def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.recipes.count()
+
 
 class SubscriptionCreateSerializer(serializers.ModelSerializer):
 
@@ -92,16 +97,22 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Нельзя подписаться на себя.'
             )
-        if user.subscribers.filter(author=author).exists():
-            raise serializers.ValidationError(
-                'Вы уже подписаны на этого пользователя.'
-            )
         return attrs
 
+    def create(self, validated_data):
+        subscription = create_or_none(Subscription, **validated_data)
+        if subscription is None:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Вы уже подписаны на этого пользователя.'
+                ]
+            })
+        return subscription
+
     def to_representation(self, instance):
         return SubscriptionSerializer(
             instance.author,
-            context={'request': self.context.get('request')}
+            context=self.context
         ).data
 
 
@@ -113,24 +124,17 @@ class FavoriteCreateSerializer(serializers.Serializer):
         model = Favorite
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        user = self.context['request'].user
-        recipe = data['recipe']
-        if self.context['request'].method == 'POST':
-            if user.favorite_recipes.filter(recipe=recipe).exists():
-                raise serializers.ValidationError(
-                    'Рецепт есть в избранных.'
-                )
-        if self.context['request'].method == 'DELETE':
-            if not user.favorite_recipes.filter(recipe=recipe).exists():
-                raise serializers.ValidationError(
-                    'Рецепта нет в избранных.'
-                )
-        return data
-
+    @transaction.atomic
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
-        return Favorite.objects.create(**validated_data)
+        favorite = create_or_none(Favorite, **validated_data)
+        if favorite is None:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Рецепт есть в избранных.'
+                ]
+            })
+        return favorite
 
     def to_representation(self, instance):
         return RecipeMinifiedSerializer(
@@ -139,6 +143,17 @@ class FavoriteCreateSerializer(serializers.Serializer):
         ).data
 
 
+class RecipeBulkSerializer(serializers.Serializer):
+    recipes = BulkPrimaryKeyRelatedField(
+        queryset=Recipe.objects.all(),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES
+    )
+
+    def validate_recipes(self, recipes):
+        return list({recipe.id: recipe for recipe in recipes}.values())
+
+
 class ShoppingCartCreateSerializer(serializers.Serializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True)
     recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
@@ -147,22 +162,17 @@ class ShoppingCartCreateSerializer(serializers.Serializer):
         model = ShoppingCart
         fields = ('user', 'recipe')
 
-    def validate(self, attrs):
-        user = self.context['request'].user
-        recipe = attrs['recipe']
-        if self.context['request'].method == 'POST':
-            if user.shopping_carts.filter(recipe=recipe).exists():
-                raise serializers.ValidationError(
-                    'Рецепт находится в корзине.'
-                )
-        if self.context['request'].method == 'DELETE':
-            if user.shopping_carts.filter(recipe=recipe).exists():
-                raise serializers.ValidationError('Рецепта нет в корзине.')
-        return attrs
-
+    @transaction.atomic
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
-        return ShoppingCart.objects.create(**validated_data)
+        shopping_cart = create_or_none(ShoppingCart, **validated_data)
+        if shopping_cart is None:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Рецепт находится в корзине.'
+                ]
+            })
+        return shopping_cart
 
     def to_representation(self, instance):
         return RecipeMinifiedSerializer(
@@ -183,10 +193,21 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        ingredients = super().to_internal_value(data)
+        resolved = resolve_ids(
+            Ingredient.objects.all(),
+            [ingredient['id'] for ingredient in ingredients]
+        )
+        for ingredient, obj in zip(ingredients, resolved):
+            ingredient['id'] = obj
+        return ingredients
+
+
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(min_value=1)
     amount = serializers.IntegerField(
         validators=[
             MinValueValidator(MIN_AMOUNT),
@@ -197,6 +218,7 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -205,32 +227,51 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True, source='ingredient_list'
     )
     image = Base64ImageField()
+    image_renditions = serializers.SerializerMethodField()
     author = CustomUserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        exclude = ('pub_date',)
+        exclude = (
+            'pub_date', 'search_vector', 'favorites_count', 'in_carts_count'
+        )
+
+    def get_image_renditions(self, obj):
+        request = self.context.get('request')
+        return {
+            name: {
+                extension: request.build_absolute_uri(
+                    default_storage.url(path)
+                )
+                for extension, path in formats.items()
+            }
+            for name, formats in obj.image_renditions.items()
+        }
 
     def get_is_favorited(self, obj):
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return user.favorite_recipes.filter(recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return user.shopping_carts.filter(recipe=obj).exists()
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientCreateSerializer(many=True)
     image = Base64ImageField(use_url=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all(), required=True
+    tags = BulkPrimaryKeyRelatedField(
+        queryset=Tag.objects.all(), required=True
     )
     author = CustomUserSerializer(
         read_only=True
@@ -255,9 +296,26 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             context={'request': self.context.get('request')}
         ).data
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Хранилище перемещает временный файл большого изображения,
+            # незакрытый файл потом не удаётся удалить при сборке мусора.
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
     def validate(self, attrs):
-        tags = attrs.get('tags')
-        ingredients = attrs.get('ingredients')
+        # При PATCH проверяем только переданные коллекции.
+        if not self.partial or 'tags' in attrs:
+            self._validate_tags(attrs.get('tags'))
+        if not self.partial or 'ingredients' in attrs:
+            self._validate_ingredients(attrs.get('ingredients'))
+        return attrs
+
+    @staticmethod
+    def _validate_tags(tags):
         if not tags:
             raise serializers.ValidationError(
                 'Укажите теги рецепта.'
@@ -266,6 +324,9 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Теги не должны повторяться.'
             )
+
+    @staticmethod
+    def _validate_ingredients(ingredients):
         if not ingredients:
             raise serializers.ValidationError(
                 'Должен быть хотя бы 1 ингредиент.'
@@ -275,8 +336,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингредиенты не должны повторяться.'
             )
-        return attrs
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -286,16 +347,64 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             **validated_data
         )
         recipe.tags.set(tags)
+        schedule_recipe_image(recipe)
         return self._add_ingredients(ingredients, recipe)
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if 'image' in validated_data:
+            discard_renditions(instance.image_renditions)
+            validated_data['image_renditions'] = {}
+            schedule_recipe_image(instance)
         super().update(instance, validated_data)
-        return self._add_ingredients(ingredients, instance)
+        if tags is not None:
+            # set() сам вычисляет разницу с текущими тегами.
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self._update_ingredients(ingredients, instance)
+        return instance
+
+    @staticmethod
+    def _update_ingredients(ingredients, recipe):
+        """Изменить только отличающиеся строки RecipeIngredient."""
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.ingredient_list.all()
+        }
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        changes = dict(amounts)
+        to_create, to_update, to_delete = [], [], []
+        for ingredient_id, recipe_ingredient in existing.items():
+            amount = amounts.get(ingredient_id, 0)
+            changes[ingredient_id] = amount - recipe_ingredient.amount
+            if not amount:
+                to_delete.append(recipe_ingredient.id)
+            elif amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                to_update.append(recipe_ingredient)
+        for ingredient_id, amount in amounts.items():
+            if ingredient_id not in existing:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                ))
+        with shopping_lists_updated_by_caller():
+            if to_delete:
+                RecipeIngredient.objects.filter(id__in=to_delete).delete()
+            if to_update:
+                RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+            if to_create:
+                RecipeIngredient.objects.bulk_create(to_create)
+        ShoppingListItem.apply(
+            recipe.shopping_carts.values_list('user_id', flat=True),
+            changes
+        )
 
     @staticmethod
     def _add_ingredients(ingredients, recipe):
@@ -0,0 +1,117 @@
+import csv
+import io
+import os
+
+from django.conf import settings
+
+TXT_LINE = '{name}  - {amount}({unit})\n'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+PDF_TITLE = 'Список покупок'
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+
+
+class ShoppingListRenderer:
+    """Базовый класс рендерера списка покупок."""
+
+    content_type = None
+    extension = None
+
+    def render(self, ingredients):
+        """Отдать документ по частям для StreamingHttpResponse."""
+        raise NotImplementedError
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def render(self, ingredients):
+        for ingredient in ingredients:
+            yield TXT_LINE.format(
+                name=ingredient['ingredient__name'],
+                amount=ingredient['sum'],
+                unit=ingredient['ingredient__measurement_unit'],
+            )
+
+
+class Echo:
+    """Псевдобуфер: csv.writer сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def render(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(CSV_HEADER)
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['sum'],
+                ingredient['ingredient__measurement_unit'],
+            ))
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    """
+    PDF собирается целиком в буфере reportlab: формат не позволяет
+    отдавать документ построчно, но его размер ограничен числом
+    различных ингредиентов, а не числом рецептов в корзине.
+    """
+
+    content_type = 'application/pdf'
+    extension = 'pdf'
+
+    @staticmethod
+    def get_font():
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not font_path or not os.path.exists(font_path):
+            return 'Helvetica'
+        font_name = os.path.splitext(os.path.basename(font_path))[0]
+        if font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(font_name, font_path))
+        return font_name
+
+    def render(self, ingredients):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        buffer = io.BytesIO()
+        font = self.get_font()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        pdf.setFont(font, PDF_FONT_SIZE)
+        pdf.drawString(PDF_MARGIN, height - PDF_MARGIN, PDF_TITLE)
+        y = height - PDF_MARGIN - PDF_LINE_HEIGHT * 2
+        for ingredient in ingredients:
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(font, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN, y, TXT_LINE.format(
+                name=ingredient['ingredient__name'],
+                amount=ingredient['sum'],
+                unit=ingredient['ingredient__measurement_unit'],
+            ).rstrip())
+            y -= PDF_LINE_HEIGHT
+        pdf.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_LIST_RENDERERS = {
+    renderer.extension: renderer
+    for renderer in (
+        TxtShoppingListRenderer,
+        CsvShoppingListRenderer,
+        PdfShoppingListRenderer,
+    )
+}
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api import async_views
 from api.views import (
     CustomUserViewSet, IngredientViewSet,
     RecipeViewSet, TagViewSet
@@ -12,7 +14,67 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', CustomUserViewSet, basename='users')
 
-urlpatterns = [
+LIST_ACTIONS = {'get': 'list'}
+DETAIL_ACTIONS = {'get': 'retrieve'}
+
+
+def sync_view(viewset, basename, detail, actions):
+    """Представление вьюсета с теми же параметрами, что даёт роутер."""
+    initkwargs = {}
+    for action in actions.values():
+        initkwargs.update(getattr(getattr(viewset, action), 'kwargs', {}))
+    return viewset.as_view(
+        actions, basename=basename, detail=detail, **initkwargs
+    )
+
+
+urlpatterns = []
+
+if settings.ASYNC_READ_API:
+    # Чтение - асинхронно, запись и курсорная пагинация - прежним DRF.
+    # Остальные пути, в том числе действия вьюсетов, обслуживает роутер.
+    urlpatterns += [
+        path('recipes/', async_views.read_path(
+            async_views.recipe_list,
+            sync_view(RecipeViewSet, 'recipes', False, {
+                **LIST_ACTIONS, 'post': 'create'
+            }),
+            sync_params=(RecipeViewSet.pagination_class.cursor_query_param,)
+        )),
+        path('recipes/<int:pk>/', async_views.read_path(
+            async_views.recipe_detail,
+            sync_view(RecipeViewSet, 'recipes', True, {
+                **DETAIL_ACTIONS,
+                'put': 'update',
+                'patch': 'partial_update',
+                'delete': 'destroy',
+            })
+        )),
+        path('tags/', async_views.read_path(
+            async_views.tag_list,
+            sync_view(TagViewSet, 'tags', False, LIST_ACTIONS)
+        )),
+        path('tags/<int:pk>/', async_views.read_path(
+            async_views.tag_detail,
+            sync_view(TagViewSet, 'tags', True, DETAIL_ACTIONS)
+        )),
+        path('ingredients/', async_views.read_path(
+            async_views.ingredient_list,
+            sync_view(IngredientViewSet, 'ingredients', False, LIST_ACTIONS)
+        )),
+        path('ingredients/<int:pk>/', async_views.read_path(
+            async_views.ingredient_detail,
+            sync_view(IngredientViewSet, 'ingredients', True, DETAIL_ACTIONS)
+        )),
+        path('users/subscriptions/', async_views.read_path(
+            async_views.subscriptions,
+            sync_view(CustomUserViewSet, 'users', False, {
+                'get': 'subscriptions'
+            })
+        )),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
     path('auth/', include('djoser.urls')),
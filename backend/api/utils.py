@@ -0,0 +1,98 @@
+from django.db import connections, router
+from django.db.models.signals import post_save
+
+
+def create_or_none(model, **fields):
+    """
+    Создать запись одним INSERT ... ON CONFLICT DO NOTHING.
+    Возвращает объект или None, если запись уже есть: повторный
+    запрос не падает с IntegrityError на уникальном ограничении.
+    post_save отправляется так же, как при обычном save().
+    """
+    obj = model(**fields)
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    opts = model._meta
+    insert_fields = [
+        field for field in opts.concrete_fields if not field.primary_key
+    ]
+    sql = (
+        f'INSERT INTO {quote(opts.db_table)} '
+        f'({", ".join(quote(field.column) for field in insert_fields)}) '
+        f'VALUES ({", ".join(["%s"] * len(insert_fields))}) '
+        f'ON CONFLICT DO NOTHING RETURNING {quote(opts.pk.column)}'
+    )
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, True), connection)
+        for field in insert_fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    obj.pk = row[0]
+    obj._state.adding = False
+    obj._state.db = using
+    post_save.send(
+        sender=model, instance=obj, created=True,
+        update_fields=None, raw=False, using=using
+    )
+    return obj
+
+
+def user_recipe_columns(model, quote):
+    """Столбцы пользователя и рецепта модели избранного или корзины."""
+    return [
+        quote(model._meta.get_field(name).column)
+        for name in ('user', 'recipe')
+    ]
+
+
+def add_user_recipes(model, user, recipe_ids):
+    """
+    Добавить рецепты в избранное или корзину одной многострочной
+    вставкой. Возвращает id рецептов, которые действительно добавлены.
+    """
+    if not recipe_ids:
+        return []
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    user_column, recipe_column = user_recipe_columns(model, quote)
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({user_column}, {recipe_column}) '
+        f'VALUES {", ".join(["(%s, %s)"] * len(recipe_ids))} '
+        f'ON CONFLICT DO NOTHING RETURNING {recipe_column}'
+    )
+    params = [value for pk in recipe_ids for value in (user.pk, pk)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def remove_user_recipes(model, user, recipe_ids=None):
+    """
+    Удалить рецепты (или все, если recipe_ids не передан) из избранного
+    или корзины одной командой. Возвращает id удалённых рецептов.
+    """
+    if recipe_ids is not None and not recipe_ids:
+        return []
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    user_column, recipe_column = user_recipe_columns(model, quote)
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {user_column} = %s'
+    )
+    params = [user.pk]
+    if recipe_ids is not None:
+        sql += (
+            f' AND {recipe_column} IN '
+            f'({", ".join(["%s"] * len(recipe_ids))})'
+        )
+        params.extend(recipe_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(sql + f' RETURNING {recipe_column}', params)
+        return [row[0] for row in cursor.fetchall()]
@@ -1,46 +1,84 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Count, Exists, F, OuterRef, Prefetch, Value, Window
+)
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import (
     AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
 
+from api.autocomplete import autocomplete_ingredients
+from api.caching import ReferenceCacheMixin
 from api.filters import IngredientFilter, RecipeFilter
-from api.paginators import CustomPagination
+from api.paginators import CustomPagination, RecipePagination
 from api.permissions import IsAuthorAdminOrReadOnly
 from api.serializers import (
     CustomUserSerializer, FavoriteCreateSerializer,
-    IngredientSerializer, RecipeCreateSerializer,
-    RecipeSerializer, ShoppingCartCreateSerializer,
+    IngredientSerializer, RecipeBulkSerializer, RecipeCreateSerializer,
+    RecipeMinifiedSerializer, RecipeSerializer, ShoppingCartCreateSerializer,
     SubscriptionCreateSerializer, SubscriptionSerializer, TagSerializer
 )
+from api.shopping_list import SHOPPING_LIST_RENDERERS
+from api.utils import add_user_recipes, remove_user_recipes
 from recipes.models import (
-    Ingredient, Recipe, RecipeIngredient, Tag
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Tag
 )
-from users.models import CustomUser
+from recipes.signals import recipes_added, recipes_removed
+from users.models import CustomUser, Subscription
+
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet
+):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     search_fields = ('^name',)
+    cache_query_params = ('name',)
     pagination_class = None
 
+    @action(detail=False, methods=['GET'])
+    def autocomplete(self, request):
+        name = request.query_params.get('name', '').strip()
+        limit = request.query_params.get('limit', AUTOCOMPLETE_LIMIT)
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= MAX_AUTOCOMPLETE_LIMIT:
+            return Response(
+                f'limit должен быть от 1 до {MAX_AUTOCOMPLETE_LIMIT}.',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not name:
+            return Response([])
+        serializer = self.get_serializer(
+            autocomplete_ingredients(name, limit), many=True
+        )
+        return Response(serializer.data)
+
 
 class CustomUserViewSet(UserViewSet):
     queryset = CustomUser.objects.all()
@@ -61,13 +99,50 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         # queryset = request.user.author.all() Не может отобразить на сайте(
-        queryset = CustomUser.objects.filter(author__user=self.request.user)
-        pages = self.paginate_queryset(queryset)
+        recipes_limit = self.get_recipes_limit()
+        pages = self.paginate_queryset(self.get_subscriptions(recipes_limit))
         serializer = SubscriptionSerializer(
-            pages, many=True, context={'request': request}
+            pages, many=True, context={
+                'request': request, 'recipes_limit': recipes_limit
+            }
         )
         return self.get_paginated_response(serializer.data)
 
+    def get_subscriptions(self, recipes_limit):
+        """Авторы, на которых подписан пользователь, с их рецептами."""
+        recipes = Recipe.objects.all()
+        if recipes_limit:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author'),
+                    order_by=(F('pub_date').desc(), F('id').desc())
+                )
+            ).filter(row_number__lte=recipes_limit)
+        return CustomUser.objects.filter(
+            author__user=self.request.user
+        ).annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by(
+            # Meta.ordering не применяется к запросам с GROUP BY.
+            *CustomUser._meta.ordering
+        ).prefetch_related(Prefetch('recipes', queryset=recipes))
+
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            recipes_limit = 0
+        if recipes_limit < 1:
+            raise ValidationError(
+                {'recipes_limit': 'Должно быть целым числом больше нуля.'}
+            )
+        return recipes_limit
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -79,7 +154,10 @@ class CustomUserViewSet(UserViewSet):
         if request.method == 'POST':
             serializer = SubscriptionCreateSerializer(
                 data={'user': request.user.id, 'author': author.id},
-                context={'request': request}
+                context={
+                    'request': request,
+                    'recipes_limit': self.get_recipes_limit()
+                }
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
@@ -96,17 +174,75 @@ class CustomUserViewSet(UserViewSet):
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.defer('search_vector')
     permission_classes = [IsAuthorAdminOrReadOnly]
-    pagination_class = CustomPagination
-    filter_backends = [DjangoFilterBackend]
+    pagination_class = RecipePagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
+    # Как <int:pk> у асинхронных путей: id рецепта уходит и в сырой SQL.
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        return self.with_read_data(queryset)
+
+    def with_read_data(self, queryset):
+        """Связи и отметки пользователя для RecipeSerializer."""
+        queryset = queryset.prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'ingredient_list',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.select_related('author')
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        ).prefetch_related(
+            Prefetch(
+                'author',
+                queryset=CustomUser.objects.annotate(
+                    is_subscribed=Exists(
+                        Subscription.objects.filter(
+                            user=user, author=OuterRef('pk')
+                        )
+                    )
+                )
+            )
+        )
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeSerializer
         return RecipeCreateSerializer
 
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.reload_instance(serializer)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.reload_instance(serializer)
+
+    def reload_instance(self, serializer):
+        # Ответ строит RecipeSerializer: перечитываем рецепт так же,
+        # как retrieve, иначе он делает запрос на каждый ингредиент.
+        serializer.instance = self.with_read_data(
+            super().get_queryset()
+        ).get(pk=serializer.instance.pk)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -123,15 +259,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            recipe = get_object_or_404(Recipe, id=pk)
-            user = request.user
-            delete_favorite = user.favorite_recipes.filter(recipe=recipe)
-            if not delete_favorite.exists():
+            if not self.remove_recipes(request.user, Favorite, [pk]):
                 return Response(
                     'Нет избранного.',
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            delete_favorite.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -151,27 +283,83 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            recipe = get_object_or_404(Recipe, id=pk)
-            user = request.user
-            delete_shopping_cart = user.shopping_carts.filter(recipe=recipe)
-            if not delete_shopping_cart.exists():
+            if not self.remove_recipes(request.user, ShoppingCart, [pk]):
                 return Response(
                     'Нет покупок.',
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            delete_shopping_cart.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @staticmethod
-    def ingredients_txt(ingredients):
-        shopping_list = ''
-        for ingredient in ingredients:
-            shopping_list += (
-                f'{ingredient["ingredient__name"]}  - '
-                f'{ingredient["sum"]}'
-                f'({ingredient["ingredient__measurement_unit"]})\n'
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite',
+        url_name='favorite-bulk'
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_user_recipes(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk'
+    )
+    def shopping_cart_bulk(self, request):
+        if request.method == 'DELETE' and 'recipes' not in request.data:
+            self.remove_recipes(request.user, ShoppingCart, None)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.bulk_user_recipes(request, ShoppingCart)
+
+    def bulk_user_recipes(self, request, model):
+        """Добавить или убрать до MAX_BULK_RECIPES рецептов за раз."""
+        serializer = RecipeBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+        if request.method == 'DELETE':
+            self.remove_recipes(
+                request.user, model, [recipe.id for recipe in recipes]
             )
-        return shopping_list
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        with transaction.atomic():
+            added = set(add_user_recipes(
+                model, request.user, [recipe.id for recipe in recipes]
+            ))
+            recipes_added(model, request.user.id, added)
+        serializer = RecipeMinifiedSerializer(
+            [recipe for recipe in recipes if recipe.id in added],
+            many=True,
+            context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def remove_recipes(user, model, recipe_ids):
+        """
+        Единственный путь удаления из избранного и корзины в API,
+        одиночного и пакетного. Возвращает id удалённых рецептов.
+        """
+        with transaction.atomic():
+            removed = remove_user_recipes(model, user, recipe_ids)
+            recipes_removed(model, user.id, removed)
+        return removed
+
+    def get_shopping_list(self):
+        return ShoppingListItem.objects.filter(
+            user=self.request.user
+        ).values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            sum=F('amount')
+        ).order_by('ingredient__name')
+
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= у выгрузки выбирает рендерер списка покупок, а не DRF.
+        if self.action == 'download_shopping_cart':
+            force = True
+        return super().perform_content_negotiation(request, force)
 
     @action(
         detail=False,
@@ -179,11 +367,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_carts__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(sum=Sum('amount'))
-        shopping_list = self.ingredients_txt(ingredients)
-        return HttpResponse(shopping_list, content_type='text/plain')
+        file_format = request.query_params.get('format', 'txt')
+        renderer_class = SHOPPING_LIST_RENDERERS.get(file_format)
+        if renderer_class is None:
+            return Response(
+                f'Неизвестный формат: {file_format}.',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        renderer = renderer_class()
+        response = StreamingHttpResponse(
+            renderer.render(self.get_shopping_list().iterator()),
+            content_type=renderer.content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.extension}"'
+        )
+        return response
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 
@@ -46,6 +47,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Замер запросов к БД на каждый HTTP-запрос, включается переменной окружения.
+QUERY_BUDGET_ENABLED = os.getenv('QUERY_BUDGET_ENABLED', 'False') == 'True'
+QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', 20))
+if QUERY_BUDGET_ENABLED:
+    MIDDLEWARE.insert(0, 'api.middleware.QueryBudgetMiddleware')
+
 ROOT_URLCONF = 'foodgram_backend.urls'
 
 TEMPLATES = [
@@ -71,6 +78,18 @@ WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
 
+# Асинхронные эндпоинты чтения под ASGI (uvicorn-воркеры gunicorn).
+ASYNC_READ_API = os.getenv('ASYNC_READ_API', 'False') == 'True'
+
+# Сколько секунд соединение живёт между запросами: 0 - новое
+# на каждый запрос, None - без ограничения. Держится одно соединение
+# на поток, поэтому потоки gunicorn (GUNICORN_THREADS) работают как пул.
+# Под ASGI запросы к БД идут из разных потоков, и постоянные соединения
+# не закрываются вовремя, поэтому там по умолчанию 0.
+DB_CONN_MAX_AGE = os.getenv(
+    'DB_CONN_MAX_AGE', '0' if ASYNC_READ_API else '60'
+)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -78,7 +97,21 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': (
+            None if DB_CONN_MAX_AGE == 'None' else int(DB_CONN_MAX_AGE)
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+        ),
+        # True за PgBouncer в режиме transaction: серверные курсоры
+        # .iterator() не переживают смену соединения между транзакциями.
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True'
+        ),
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
@@ -119,13 +152,25 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+IMAGE_RENDITIONS = {'small': 320, 'medium': 640, 'large': 1280}
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 2))
+IMAGE_PIPELINE_ASYNC = os.getenv('IMAGE_PIPELINE_ASYNC', 'True') == 'True'
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
@@ -133,6 +178,34 @@ REST_FRAMEWORK = {
 
 }
 
+# Без REDIS_URL у каждого процесса gunicorn свой LocMemCache: сброс
+# версии справочника при изменении виден только процессу, который его
+# сделал, а import_csv - отдельный процесс. Остальные отдают старый ответ
+# не дольше REFERENCE_CACHE_TTL секунд.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+
+REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', 300))
+
+# Кэш токенов включается явно и только вместе с REDIS_URL: каждая
+# локальная запись сверяется с общим кэшем, поэтому выход, смена пароля
+# и деактивация сразу видны всем процессам. С LocMemCache у каждого
+# процесса был бы свой кэш, и сброс доходил бы до остальных лишь через TTL.
+TOKEN_AUTH_CACHE = {
+    'ENABLED': os.getenv('TOKEN_AUTH_CACHE', 'False') == 'True',
+    'TTL': int(os.getenv('TOKEN_AUTH_CACHE_TTL', 60)),
+    'MAX_SIZE': int(os.getenv('TOKEN_AUTH_CACHE_MAX_SIZE', 10000)),
+}
+if TOKEN_AUTH_CACHE['ENABLED'] and not os.getenv('REDIS_URL'):
+    raise ImproperlyConfigured(
+        'TOKEN_AUTH_CACHE требует общего кэша: задайте REDIS_URL.'
+    )
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -162,5 +235,10 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        'api.query_budget': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
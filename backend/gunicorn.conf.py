@@ -0,0 +1,24 @@
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(
+    os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+)
+# С потоками у каждого рабочего процесса свой набор постоянных
+# соединений с БД: не больше GUNICORN_THREADS на процесс. Всего
+# соединений workers * threads, это должно быть меньше max_connections.
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+if os.getenv('ASYNC_READ_API', 'False') == 'True':
+    # Асинхронные эндпоинты чтения работают только под ASGI.
+    wsgi_app = 'foodgram_backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram_backend.wsgi:application'
+    worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Перезапуск процессов не даёт копиться утечкам памяти; разброс -
+# чтобы процессы не перезапускались одновременно.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
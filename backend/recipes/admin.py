@@ -28,7 +28,7 @@ class RecipeIngredientInline(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     list_display = (
         'pub_date', 'name', 'author',
-        'text', 'image'
+        'text', 'image', 'favorites_count'
     )
     list_display_links = ('name',)
     list_filter = ('author', 'tags')
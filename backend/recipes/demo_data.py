@@ -0,0 +1,255 @@
+"""
+Генерация правдоподобных данных для стендов и замеров производительности.
+
+Данные детерминированы при одинаковом seed и пишутся пачками: через
+bulk_create или, на PostgreSQL, через COPY FROM STDIN без построения
+объектов моделей. Сигналы при этом не срабатывают, поэтому после
+генерации нужно вызвать refresh_aggregates().
+"""
+import io
+import json
+import random
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag,
+    recipe_search_vector
+)
+from users.models import CustomUser, Subscription
+
+BATCH_SIZE = 5000
+DEMO_PASSWORD = 'demo-password'
+DEMO_IMAGE = 'recipes/demo.png'
+DEMO_IMAGE_SIZE = (640, 480)
+MIN_RECIPE_INGREDIENTS = 5
+MAX_RECIPE_INGREDIENTS = 30
+FAVORITES_PER_USER = 20
+CARTS_PER_USER = 10
+SUBSCRIPTIONS_PER_USER = 10
+WORDS = (
+    'суп', 'салат', 'пирог', 'каша', 'рагу', 'запеканка', 'омлет',
+    'паста', 'плов', 'борщ', 'блины', 'котлеты', 'соус', 'десерт',
+    'домашний', 'быстрый', 'летний', 'острый', 'сливочный', 'овощной',
+)
+COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'
+})
+
+
+def copy_value(value):
+    """Значение в текстовом формате COPY."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        value = json.dumps(value)
+    return str(value).translate(COPY_ESCAPES)
+
+
+def copy_rows(model, fields, rows):
+    """Записать строки в таблицу модели через COPY FROM STDIN."""
+    columns = ', '.join(
+        connection.ops.quote_name(model._meta.get_field(name).column)
+        for name in fields
+    )
+    sql = (
+        f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+        f'({columns}) FROM STDIN'
+    )
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                return
+            buffer = io.StringIO()
+            for row in batch:
+                buffer.write('\t'.join(map(copy_value, row)))
+                buffer.write('\n')
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+
+
+def save_rows(model, fields, rows, copy=False):
+    """Записать строки-кортежи со значениями полей fields."""
+    if copy:
+        return copy_rows(model, fields, rows)
+    model.objects.bulk_create(
+        (model(**dict(zip(fields, row))) for row in rows),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def reserve_ids(model, count):
+    """Выделить count первичных ключей из последовательности таблицы."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+            'FROM generate_series(1, %s)',
+            [model._meta.db_table, model._meta.pk.column, count]
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+
+def ensure_reference_data():
+    """Ингредиенты и теги из data/, если база ещё пустая."""
+    if not Ingredient.objects.exists() or not Tag.objects.exists():
+        call_command('import_csv', stdout=io.StringIO())
+
+
+def ensure_demo_image():
+    """Общая картинка демо-рецептов, если её ещё нет в хранилище."""
+    if default_storage.exists(DEMO_IMAGE):
+        return
+    buffer = io.BytesIO()
+    Image.new('RGB', DEMO_IMAGE_SIZE, 'lightgray').save(buffer, 'PNG')
+    default_storage.save(DEMO_IMAGE, ContentFile(buffer.getvalue()))
+
+
+def make_users(count, seed=0, prefix='demo', start=0):
+    password = make_password(DEMO_PASSWORD)
+    users = CustomUser.objects.bulk_create(
+        (
+            CustomUser(
+                email=f'{prefix}{seed}_{number}@example.com',
+                username=f'{prefix}{seed}_{number}',
+                first_name='Демо',
+                last_name=f'Пользователь {number}',
+                password=password,
+            )
+            for number in range(start, start + count)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return [user.id for user in users]
+
+
+def make_recipes(user_ids, count, seed=0, copy=False):
+    """Рецепты со случайными тегами и 5-30 ингредиентами каждый."""
+    rng = random.Random(seed)
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+    rows = [
+        (
+            rng.choice(user_ids),
+            ' '.join(rng.sample(WORDS, 3)).capitalize(),
+            ' '.join(rng.choices(WORDS, k=40)),
+            rng.randint(5, 180),
+        )
+        for _ in range(count)
+    ]
+    if copy:
+        recipe_ids = reserve_ids(Recipe, count)
+        now = timezone.now()
+        copy_rows(
+            Recipe,
+            ('id', 'author_id', 'name', 'text', 'cooking_time', 'image',
+             'image_renditions', 'pub_date', 'favorites_count',
+             'in_carts_count'),
+            (
+                (pk, *row, DEMO_IMAGE, {}, now, 0, 0)
+                for pk, row in zip(recipe_ids, rows)
+            ),
+        )
+    else:
+        recipe_ids = [
+            recipe.id for recipe in Recipe.objects.bulk_create(
+                (
+                    Recipe(
+                        author_id=author_id, name=name, text=text,
+                        cooking_time=cooking_time, image=DEMO_IMAGE,
+                    )
+                    for author_id, name, text, cooking_time in rows
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        ]
+    save_rows(
+        RecipeIngredient,
+        ('recipe_id', 'ingredient_id', 'amount'),
+        (
+            (recipe_id, ingredient_id, rng.randint(1, 1000))
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(ingredient_ids, rng.randint(
+                MIN_RECIPE_INGREDIENTS, MAX_RECIPE_INGREDIENTS
+            ))
+        ),
+        copy,
+    )
+    save_rows(
+        Recipe.tags.through,
+        ('recipe_id', 'tag_id'),
+        (
+            (recipe_id, tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+        ),
+        copy,
+    )
+    return recipe_ids
+
+
+def pairs(rng, left_ids, right_ids, per_left, allow_same=True):
+    """Уникальные случайные пары (left, right), до per_left на каждый left."""
+    for left in left_ids:
+        count = min(rng.randint(0, per_left), len(right_ids))
+        for right in rng.sample(right_ids, count):
+            if allow_same or left != right:
+                yield left, right
+
+
+def make_relations(user_ids, recipe_ids, seed=0, authors=None, copy=False):
+    """
+    Избранное, корзины и подписки пользователей user_ids. Пары уникальны
+    для каждого пользователя, поэтому части можно писать независимо.
+    """
+    rng = random.Random(seed)
+    save_rows(
+        Favorite, ('user_id', 'recipe_id'),
+        pairs(rng, user_ids, recipe_ids, FAVORITES_PER_USER), copy,
+    )
+    save_rows(
+        ShoppingCart, ('user_id', 'recipe_id'),
+        pairs(rng, user_ids, recipe_ids, CARTS_PER_USER), copy,
+    )
+    save_rows(
+        Subscription, ('user_id', 'author_id'),
+        pairs(
+            rng, user_ids, authors or user_ids, SUBSCRIPTIONS_PER_USER,
+            allow_same=False,
+        ),
+        copy,
+    )
+
+
+def refresh_aggregates():
+    """Пересчитать то, что обычно поддерживают сигналы и Recipe.save()."""
+    call_command('reconcile_recipe_counters', stdout=io.StringIO())
+    call_command('rebuild_shopping_lists', stdout=io.StringIO())
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(search_vector__isnull=True).update(
+            search_vector=recipe_search_vector()
+        )
+
+
+def generate(users, recipes, seed=0, prefix='demo'):
+    """Сгенерировать данные в текущем процессе."""
+    ensure_reference_data()
+    ensure_demo_image()
+    user_ids = make_users(users, seed, prefix)
+    recipe_ids = make_recipes(user_ids, recipes, seed)
+    make_relations(user_ids, recipe_ids, seed)
+    refresh_aggregates()
+    return user_ids, recipe_ids
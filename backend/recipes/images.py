@@ -0,0 +1,106 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions'
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True},
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_PIPELINE_WORKERS,
+    thread_name_prefix='recipe-images'
+)
+
+
+def make_renditions(image_file, prefix):
+    """
+    Сохранить уменьшенные копии изображения без метаданных во всех
+    форматах и вернуть их пути в хранилище: {размер: {формат: путь}}.
+    """
+    with Image.open(image_file) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+        renditions = {}
+        for name, width in settings.IMAGE_RENDITIONS.items():
+            image = original.copy()
+            image.thumbnail((width, width * 4))
+            renditions[name] = {}
+            for extension, options in FORMATS.items():
+                if extension == 'jpeg' and image.mode == 'RGBA':
+                    converted = Image.new('RGB', image.size, 'white')
+                    converted.paste(image, mask=image.split()[-1])
+                else:
+                    converted = image
+                buffer = io.BytesIO()
+                converted.save(buffer, **options)
+                path = default_storage.save(
+                    f'{RENDITIONS_DIR}/{prefix}_{name}.{extension}',
+                    ContentFile(buffer.getvalue())
+                )
+                renditions[name][extension] = path
+    return renditions
+
+
+def delete_renditions(renditions):
+    for formats in renditions.values():
+        for path in formats.values():
+            default_storage.delete(path)
+
+
+def discard_renditions(renditions):
+    """Удалить файлы копий после коммита, когда они уже не нужны."""
+    if renditions:
+        transaction.on_commit(lambda: delete_renditions(renditions))
+
+
+def process_recipe_image(recipe_id):
+    """Построить копии изображения рецепта и записать их пути."""
+    from recipes.models import Recipe
+
+    try:
+        recipe = Recipe.objects.filter(id=recipe_id).first()
+        if recipe is None or not recipe.image:
+            return
+        stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+        with recipe.image.open('rb') as image_file:
+            renditions = make_renditions(
+                image_file, f'{recipe_id}/{stem}'
+            )
+        # Изображение могли заменить или удалить, пока шла обработка:
+        # тогда лишними оказываются новые копии, иначе - прежние.
+        updated = Recipe.objects.filter(
+            id=recipe_id, image=recipe.image.name
+        ).update(image_renditions=renditions)
+        delete_renditions(recipe.image_renditions if updated else renditions)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', recipe_id)
+
+
+def process_in_background(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    finally:
+        # У потока пула своё соединение с БД, закрываем его сами.
+        connection.close()
+
+
+def schedule_recipe_image(recipe):
+    """Обработать изображение рецепта в фоне после коммита транзакции."""
+    if settings.IMAGE_PIPELINE_ASYNC:
+        transaction.on_commit(
+            lambda: executor.submit(process_in_background, recipe.id)
+        )
+    else:
+        transaction.on_commit(lambda: process_recipe_image(recipe.id))
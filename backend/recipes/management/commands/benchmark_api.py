@@ -0,0 +1,254 @@
+import gc
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment,
+    teardown_test_environment
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes import demo_data
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import CustomUser
+
+BASELINE = "benchmark_baseline.json"
+USERS = 50
+RECIPES = 500
+ITERATIONS = 20
+WARMUP = 2
+TOLERANCE = 1.5
+CREATE_INGREDIENTS = 10
+# Картинка 1x1 пиксель: замеряем API, а не обработку изображений.
+PNG = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bKAAAAA"
+    "1BMVEUAAACnej3aAAAAAXRSTlMAQObYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMAAAAASUVOR"
+    "K5CYII="
+)
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def read_body(response):
+    if response.streaming:
+        return b"".join(response.streaming_content)
+    return response.content
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет число SQL-запросов и задержки основных эндпоинтов "
+        "на сгенерированных данных во временной тестовой базе "
+        "и сравнивает их с сохранённым эталоном."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=USERS,
+            help="Количество пользователей.",
+        )
+        parser.add_argument(
+            "--recipes", type=int, default=RECIPES,
+            help="Количество рецептов.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0,
+            help="Зерно генератора данных.",
+        )
+        parser.add_argument(
+            "--iterations", type=int, default=ITERATIONS,
+            help="Количество замеров каждого сценария.",
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=TOLERANCE,
+            help="Во сколько раз p95 может превысить эталон.",
+        )
+        parser.add_argument(
+            "--queries-only",
+            action="store_true",
+            help=(
+                "Сравнивать с эталоном только число запросов: задержки "
+                "зависят от машины (так проверка запускается в CI)."
+            ),
+        )
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, "data", BASELINE),
+            help="Файл эталона.",
+        )
+        parser.add_argument(
+            "--update-baseline",
+            action="store_true",
+            help="Записать результаты как новый эталон.",
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations должен быть больше нуля.")
+        dataset = {
+            key: options[key] for key in ("users", "recipes", "seed")
+        }
+        # Отдельная база: генерация и сценарии не трогают рабочие данные.
+        # Картинки создаваемых рецептов - во временный каталог, синхронно,
+        # чтобы фоновая обработка не пережила этот каталог.
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    MEDIA_ROOT=media_root, IMAGE_PIPELINE_ASYNC=False
+                ):
+                    self.stdout.write(f"Генерация данных: {dataset}")
+                    demo_data.generate(
+                        dataset["users"], dataset["recipes"], dataset["seed"]
+                    )
+                    results = self.run_scenarios(options["iterations"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        self.report(results)
+        if options["update_baseline"]:
+            with open(options["baseline"], "w", encoding="utf-8") as file:
+                json.dump(
+                    {"dataset": dataset, "scenarios": results},
+                    file, ensure_ascii=False, indent=2,
+                )
+                file.write("\n")
+            self.stdout.write(self.style.SUCCESS("Эталон обновлён."))
+            return
+        self.compare(results, dataset, options)
+
+    def scenarios(self):
+        """Сценарии: имя -> функция, выполняющая один запрос."""
+        user = CustomUser.objects.annotate(
+            subscriptions=Count("subscribers"),
+        ).order_by("-subscriptions", "id").first()
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        anonymous = APIClient()
+        recipe = Recipe.objects.order_by("id").first()
+        payload = {
+            "name": "Замер",
+            "text": "Рецепт для замера.",
+            "cooking_time": 10,
+            "image": PNG,
+            "tags": list(Tag.objects.values_list("id", flat=True)),
+            "ingredients": [
+                {"id": pk, "amount": 100}
+                for pk in Ingredient.objects.values_list(
+                    "id", flat=True
+                )[:CREATE_INGREDIENTS]
+            ],
+        }
+        return {
+            "recipes_list_anonymous": lambda: anonymous.get(
+                "/api/recipes/?limit=10"
+            ),
+            "recipes_list": lambda: client.get("/api/recipes/?limit=10"),
+            "recipes_list_cursor": lambda: client.get(
+                "/api/recipes/?limit=10&cursor="
+            ),
+            "recipe_detail": lambda: client.get(f"/api/recipes/{recipe.id}/"),
+            "subscriptions": lambda: client.get(
+                "/api/users/subscriptions/?recipes_limit=3"
+            ),
+            "download_shopping_cart": lambda: client.get(
+                "/api/recipes/download_shopping_cart/"
+            ),
+            "recipe_create": lambda: client.post(
+                "/api/recipes/", payload, format="json"
+            ),
+        }
+
+    def run_scenarios(self, iterations):
+        results = {}
+        for name, request in self.scenarios().items():
+            for _ in range(WARMUP):
+                read_body(request())
+            # Сборщик мусора даёт случайные выбросы в p95, отключаем его.
+            gc.collect()
+            gc.disable()
+            try:
+                results[name] = self.measure(name, request, iterations)
+            finally:
+                gc.enable()
+        return results
+
+    def measure(self, name, request, iterations):
+        durations = []
+        queries = 0
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = request()
+                read_body(response)
+                durations.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f"{name}: ответ {response.status_code}.")
+            queries = max(queries, len(context))
+        return {
+            "queries": queries,
+            "p50_ms": round(statistics.median(durations), 2),
+            "p95_ms": round(percentile(durations, 0.95), 2),
+            "p99_ms": round(percentile(durations, 0.99), 2),
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'сценарий':<26}{'запросы':>8}{'p50':>10}{'p95':>10}{'p99':>10}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<26}{result['queries']:>8}"
+                f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                f"{result['p99_ms']:>10.2f}"
+            )
+
+    def compare(self, results, dataset, options):
+        try:
+            with open(options["baseline"], encoding="utf-8") as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            raise CommandError(
+                "Эталон не найден, запустите с --update-baseline."
+            )
+        if baseline["dataset"] != dataset:
+            raise CommandError(
+                f"Эталон снят на других данных: {baseline['dataset']}."
+            )
+        regressions = []
+        for name, result in results.items():
+            expected = baseline["scenarios"].get(name)
+            if expected is None:
+                continue
+            # Число запросов не зависит от машины и сравнивается точно.
+            if result["queries"] > expected["queries"]:
+                regressions.append(
+                    f"{name}: {result['queries']} запросов "
+                    f"вместо {expected['queries']}"
+                )
+            if options["queries_only"]:
+                continue
+            if result["p95_ms"] > expected["p95_ms"] * options["tolerance"]:
+                regressions.append(
+                    f"{name}: p95 {result['p95_ms']} мс "
+                    f"при эталоне {expected['p95_ms']} мс"
+                )
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(regression))
+        if regressions:
+            raise CommandError(f"Регрессий: {len(regressions)}.")
+        self.stdout.write(self.style.SUCCESS("Регрессий нет."))
@@ -0,0 +1,106 @@
+import statistics
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from recipes.management.commands.benchmark_api import percentile
+
+PATH = "/api/recipes/"
+QUERY = "limit=10"
+REQUESTS = 200
+WARMUP = 5
+# Режимы: (описание, CONN_MAX_AGE, CONN_HEALTH_CHECKS).
+MODES = (
+    ("Новое соединение на запрос", 0, False),
+    ("Постоянное соединение", None, False),
+    ("Постоянное с проверкой", None, True),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает задержку запросов к API с новым соединением с БД "
+        "на каждый запрос и с постоянным соединением. Запросы идут "
+        "через WSGI-обработчик к настроенной базе, только чтение."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path", default=PATH,
+            help="Путь эндпоинта (GET).",
+        )
+        parser.add_argument(
+            "--query", default=QUERY,
+            help="Строка запроса.",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=REQUESTS,
+            help="Количество запросов в каждом режиме.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1:
+            raise CommandError("--requests должен быть больше нуля.")
+        settings_dict = connection.settings_dict
+        saved = (
+            settings_dict["CONN_MAX_AGE"], settings_dict["CONN_HEALTH_CHECKS"]
+        )
+        # setup_test_environment разрешает хост testserver.
+        setup_test_environment()
+        handler = WSGIHandler()
+        results = {}
+        try:
+            for name, max_age, health_checks in MODES:
+                # Настройки читаются при открытии соединения.
+                connection.close()
+                settings_dict["CONN_MAX_AGE"] = max_age
+                settings_dict["CONN_HEALTH_CHECKS"] = health_checks
+                results[name] = self.measure(
+                    handler, options["path"], options["query"],
+                    options["requests"],
+                )
+        finally:
+            connection.close()
+            settings_dict["CONN_MAX_AGE"], settings_dict[
+                "CONN_HEALTH_CHECKS"
+            ] = saved
+            teardown_test_environment()
+        self.stdout.write(f"{'режим':<30}{'p50, мс':>10}{'p95, мс':>10}")
+        for name, durations in results.items():
+            self.stdout.write(
+                f"{name:<30}{statistics.median(durations):>10.2f}"
+                f"{percentile(durations, 0.95):>10.2f}"
+            )
+        fresh, persistent = (
+            statistics.median(results[name]) for name, _, _ in MODES[:2]
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Постоянное соединение экономит {fresh - persistent:.2f} мс "
+            f"на запрос (p50)."
+        ))
+
+    def measure(self, handler, path, query, requests):
+        durations = []
+        for number in range(WARMUP + requests):
+            environ = {
+                "PATH_INFO": path,
+                "QUERY_STRING": query,
+                "HTTP_HOST": "testserver",
+            }
+            setup_testing_defaults(environ)
+            started = time.perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            b"".join(response)
+            # close() посылает request_finished: как у настоящего сервера,
+            # соединение закрывается или остаётся по CONN_MAX_AGE.
+            response.close()
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code >= 400:
+                raise CommandError(f"{path}: ответ {response.status_code}.")
+            if number >= WARMUP:
+                durations.append(elapsed)
+        return durations
@@ -0,0 +1,296 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment
+)
+from rest_framework.request import ForcedAuthentication, Request
+from rest_framework.test import APIRequestFactory
+
+from api.async_views import make_view
+from api.autocomplete import autocomplete_queryset
+from api.views import CustomUserViewSet, IngredientViewSet, RecipeViewSet
+from recipes import demo_data
+from recipes.models import Favorite, Recipe, Tag
+from recipes.signals import cart_user_ids
+from users.models import CustomUser
+
+USERS = 500
+RECIPES = 5000
+POSTGRES = ("postgresql",)
+ALL = ("postgresql", "sqlite")
+SUBSCRIPTION_RECIPES = 3
+SEARCH = "суп"
+INGREDIENT_NAME = "мол"
+
+
+def view_for(viewset_class, action, user, params=None, **kwargs):
+    """Вьюсет, подготовленный к действию, как для запроса API."""
+    request = Request(
+        APIRequestFactory().get("/", params or {}),
+        authenticators=[ForcedAuthentication(user, None)],
+    )
+    return make_view(viewset_class, request, action, **kwargs)
+
+
+def recipes_page(user, params=None):
+    """Страница списка рецептов: фильтры и сортировка вьюсета."""
+    view = view_for(RecipeViewSet, "list", user, params)
+    queryset = view.filter_queryset(view.get_queryset())
+    return queryset[:view.paginator.get_page_size(view.request)]
+
+
+def recipe_detail(user, recipe):
+    view = view_for(RecipeViewSet, "retrieve", user, pk=recipe.pk)
+    return view.filter_queryset(view.get_queryset()).filter(pk=recipe.pk)
+
+
+def subscriptions_page(user):
+    view = view_for(CustomUserViewSet, "subscriptions", user)
+    return view.get_subscriptions(SUBSCRIPTION_RECIPES)[
+        :view.paginator.get_page_size(view.request)
+    ]
+
+
+def prefetch_query(queryset, lookup):
+    """Запрос, которым prefetch_related(lookup) дозагружает страницу."""
+    prefetch = next(
+        prefetch for prefetch in queryset._prefetch_related_lookups
+        if getattr(prefetch, "prefetch_to", prefetch) == lookup
+    )
+    instances = list(queryset.prefetch_related(None))
+    manager = getattr(instances[0], lookup)
+    return manager.get_prefetch_queryset(instances, prefetch.queryset)[0]
+
+
+def shopping_list(user):
+    view = view_for(RecipeViewSet, "download_shopping_cart", user)
+    return view.get_shopping_list()
+
+
+def ingredients(params):
+    view = view_for(IngredientViewSet, "list", None, params)
+    return view.filter_queryset(view.get_queryset())
+
+
+# Горячие запросы API, собранные теми же вьюсетами, фильтрами
+# и функциями, что обслуживают запросы: (описание, функция от контекста,
+# индексы, которые должны быть в плане, базы данных).
+SCENARIOS = (
+    (
+        "Лента рецептов",
+        lambda context: recipes_page(context["user"]),
+        ("recipe_pub_date_id_idx",), ALL,
+    ),
+    (
+        "Рецепты автора",
+        lambda context: recipes_page(
+            context["user"], {"author": context["author"].pk}
+        ),
+        ("recipe_author_pub_date_idx",), ALL,
+    ),
+    (
+        "Популярные рецепты",
+        lambda context: recipes_page(
+            context["user"], {"ordering": "-favorites_count"}
+        ),
+        ("recipe_favorites_count_idx",), ALL,
+    ),
+    (
+        "Фильтр по тегам",
+        lambda context: recipes_page(
+            context["user"], {"tags": context["tag"].slug}
+        ),
+        ("recipe_pub_date_id_idx",), ALL,
+    ),
+    (
+        "Избранное пользователя",
+        lambda context: recipes_page(context["user"], {"is_favorited": 1}),
+        ("favorite_unique_user_recipe",), ALL,
+    ),
+    (
+        "Корзина пользователя",
+        lambda context: recipes_page(
+            context["user"], {"is_in_shopping_cart": 1}
+        ),
+        ("shoppingcart_unique_user_recipe",), ALL,
+    ),
+    (
+        "Рецепт с отметками пользователя",
+        lambda context: recipe_detail(context["user"], context["recipe"]),
+        ("favorite_unique_user_recipe", "shoppingcart_unique_user_recipe"),
+        ALL,
+    ),
+    (
+        "Ингредиенты страницы рецептов",
+        lambda context: prefetch_query(
+            recipes_page(context["user"]), "ingredient_list"
+        ),
+        ("unique_recipe_ingredient",), ALL,
+    ),
+    (
+        "Подписки пользователя",
+        lambda context: subscriptions_page(context["user"]),
+        ("unique_subscription",), ALL,
+    ),
+    (
+        "Рецепты авторов в подписках",
+        lambda context: prefetch_query(
+            subscriptions_page(context["user"]), "recipes"
+        ),
+        ("recipe_author_pub_date_idx",), ALL,
+    ),
+    (
+        "Корзины с рецептом",
+        lambda context: cart_user_ids(context["recipe"].pk),
+        ("shoppingcart_recipe_user_idx",), ALL,
+    ),
+    (
+        # Так удаление рецепта каскадом находит его в избранном.
+        "Избранное с рецептом",
+        lambda context: Favorite.objects.filter(recipe=context["recipe"]),
+        ("favorite_recipe_user_idx",), ALL,
+    ),
+    (
+        "Скачивание списка покупок",
+        lambda context: shopping_list(context["user"]),
+        ("unique_shopping_list_item",), ALL,
+    ),
+    (
+        "Поиск рецептов",
+        lambda context: recipes_page(context["user"], {"search": SEARCH}),
+        ("recipes_recipe_search_vector",), POSTGRES,
+    ),
+    (
+        "Ингредиенты по началу названия",
+        lambda context: ingredients({"name": INGREDIENT_NAME}),
+        ("recipes_ingredient_name_prefix",), POSTGRES,
+    ),
+    (
+        "Автодополнение ингредиентов",
+        lambda context: autocomplete_queryset(INGREDIENT_NAME, 10),
+        ("recipes_ingredient_name_trgm",), POSTGRES,
+    ),
+)
+
+
+def scenario_context():
+    """Самый активный пользователь и типичные объекты для запросов."""
+    user = CustomUser.objects.annotate(
+        subscriptions=Count("subscribers", distinct=True),
+        favorites=Count("favorite_recipes", distinct=True),
+    ).order_by("-subscriptions", "-favorites", "id").first()
+    recipe = Recipe.objects.order_by("-in_carts_count", "id").first()
+    return {
+        "user": user,
+        "author": recipe.author,
+        "recipe": recipe,
+        "tag": Tag.objects.order_by("id").first(),
+    }
+
+
+def scenarios():
+    """Сценарии, которые можно проверить на текущей базе."""
+    return [
+        scenario for scenario in SCENARIOS
+        if connection.vendor in scenario[3]
+    ]
+
+
+def explain(queryset):
+    # QuerySet.explain() ставит EXPLAIN внутрь подзапроса, в который
+    # Django оборачивает фильтр по оконной функции (подписки).
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{connection.ops.explain_query_prefix()} {sql}", params
+        )
+        return "\n".join(
+            " ".join(map(str, row)) for row in cursor.fetchall()
+        )
+
+
+def index_names(index):
+    """Имена, под которыми индекс может встретиться в плане."""
+    names = [index]
+    if connection.vendor == "sqlite":
+        # SQLite создаёт ограничения уникальности вместе с таблицей
+        # и называет их индексы по-своему.
+        names.extend(
+            f"sqlite_autoindex_{model._meta.db_table}_"
+            for model in apps.get_models()
+            if any(
+                constraint.name == index
+                for constraint in model._meta.constraints
+            )
+        )
+    return names
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверяет через EXPLAIN, что горячие запросы API используют "
+        "предназначенные для них индексы. Запросы строятся вьюсетами "
+        "и фильтрами API на сгенерированных данных во временной базе."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=USERS,
+            help="Количество пользователей.",
+        )
+        parser.add_argument(
+            "--recipes", type=int, default=RECIPES,
+            help="Количество рецептов.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0,
+            help="Зерно генератора данных.",
+        )
+
+    def handle(self, *args, **options):
+        # Отдельная база: планы строятся на данных реального объёма
+        # со свежей статистикой, рабочие данные не трогаются.
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(
+                f"Генерация данных: {options['users']} пользователей, "
+                f"{options['recipes']} рецептов."
+            )
+            demo_data.generate(
+                options["users"], options["recipes"], options["seed"]
+            )
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+            failures = self.check_plans(options["verbosity"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        if failures:
+            raise CommandError(
+                f"Запросов без нужного индекса: {len(failures)}."
+            )
+        self.stdout.write(self.style.SUCCESS("Все запросы идут по индексам."))
+
+    def check_plans(self, verbosity):
+        context = scenario_context()
+        failures = []
+        for name, build, indexes, _ in scenarios():
+            plan = explain(build(context))
+            if verbosity > 1:
+                self.stdout.write(f"{name}:\n{plan}")
+            missing = [
+                index for index in indexes
+                if not any(found in plan for found in index_names(index))
+            ]
+            if missing:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f"{name}: нет {', '.join(missing)}\n{plan}"
+                ))
+            else:
+                self.stdout.write(f"{name}: {', '.join(indexes)}")
+        return failures
@@ -0,0 +1,183 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from recipes import demo_data
+
+CHUNK_SIZE = 5000
+USERS_CHUNK_SIZE = 20000
+
+# Списки id, которые нужны всем задачам фазы: передаются один раз
+# при запуске процесса, а не с каждой задачей.
+worker_ids = {}
+
+
+def init_worker(user_ids, recipe_ids):
+    worker_ids["users"] = user_ids
+    worker_ids["recipes"] = recipe_ids
+
+
+def users_task(seed, prefix, start, count):
+    with transaction.atomic():
+        return demo_data.make_users(count, seed, prefix, start)
+
+
+def recipes_task(seed, chunk, count, copy):
+    with transaction.atomic():
+        return demo_data.make_recipes(
+            worker_ids["users"], count, f"{seed}:{chunk}", copy
+        )
+
+
+def relations_task(seed, chunk, start, stop, copy):
+    with transaction.atomic():
+        demo_data.make_relations(
+            worker_ids["users"][start:stop],
+            worker_ids["recipes"],
+            f"{seed}:{chunk}",
+            authors=worker_ids["users"],
+            copy=copy,
+        )
+
+
+def chunks(total, size):
+    """Пары (начало, размер) частей, на которые делится total."""
+    return [
+        (start, min(size, total - start)) for start in range(0, total, size)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу демонстрационными пользователями, рецептами, "
+        "избранным, корзинами и подписками в несколько процессов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=1000,
+            help="Количество пользователей.",
+        )
+        parser.add_argument(
+            "--recipes", type=int, default=10000,
+            help="Количество рецептов.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0,
+            help="Зерно генератора: одинаковое зерно - одинаковые данные.",
+        )
+        parser.add_argument(
+            "--prefix", default="demo",
+            help="Префикс имён и почт пользователей.",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="Количество процессов.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=CHUNK_SIZE,
+            help="Рецептов или пользователей в одной транзакции.",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Писать через COPY FROM STDIN (только PostgreSQL).",
+        )
+
+    def handle(self, *args, **options):
+        if min(options["workers"], options["chunk_size"]) < 1:
+            raise CommandError(
+                "--workers и --chunk-size должны быть больше нуля."
+            )
+        if options["users"] < 2 or options["recipes"] < 1:
+            raise CommandError("Нужно хотя бы 2 пользователя и 1 рецепт.")
+        if options["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy работает только с PostgreSQL.")
+        if connection.vendor == "sqlite" and options["workers"] > 1:
+            # SQLite не пишет параллельно, процессы только ждали бы блокировку.
+            self.stdout.write(self.style.WARNING(
+                "SQLite: генерация в одном процессе."
+            ))
+            options["workers"] = 1
+        demo_data.ensure_reference_data()
+        # Картинка одна на все рецепты: пишется до запуска процессов.
+        demo_data.ensure_demo_image()
+        seed, copy = options["seed"], options["copy"]
+
+        started = time.monotonic()
+        user_ids = [
+            pk
+            for part in self.run(
+                options["workers"], users_task,
+                [
+                    (seed, options["prefix"], start, count)
+                    for start, count in chunks(
+                        options["users"], USERS_CHUNK_SIZE
+                    )
+                ],
+            )
+            for pk in part
+        ]
+        self.report("Пользователи", len(user_ids), started)
+
+        started = time.monotonic()
+        recipe_ids = [
+            pk
+            for part in self.run(
+                options["workers"], recipes_task,
+                [
+                    (seed, chunk, count, copy)
+                    for chunk, (_, count) in enumerate(
+                        chunks(options["recipes"], options["chunk_size"])
+                    )
+                ],
+                user_ids,
+            )
+            for pk in part
+        ]
+        self.report("Рецепты с ингредиентами и тегами", len(recipe_ids),
+                    started)
+
+        started = time.monotonic()
+        list(self.run(
+            options["workers"], relations_task,
+            [
+                (seed, chunk, start, start + count, copy)
+                for chunk, (start, count) in enumerate(
+                    chunks(len(user_ids), options["chunk_size"])
+                )
+            ],
+            user_ids, recipe_ids,
+        ))
+        self.report("Избранное, корзины и подписки", len(user_ids), started)
+
+        started = time.monotonic()
+        demo_data.refresh_aggregates()
+        self.report("Счётчики и списки покупок", len(recipe_ids), started)
+        self.stdout.write(self.style.SUCCESS("Демо-данные созданы!"))
+
+    def run(self, workers, task, arguments, user_ids=(), recipe_ids=()):
+        """Выполнить задачи фазы, каждую в своей транзакции."""
+        if workers == 1:
+            init_worker(user_ids, recipe_ids)
+            return [task(*args) for args in arguments]
+        # Дочерние процессы не должны унаследовать открытое соединение.
+        connections.close_all()
+        # fork: дочерние процессы получают уже настроенный Django.
+        with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("fork"),
+            initializer=init_worker,
+            initargs=(user_ids, recipe_ids),
+        ) as executor:
+            return list(executor.map(task, *zip(*arguments)))
+
+    def report(self, name, total, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{name}: {total} за {elapsed:.2f} с "
+            f"({total / max(elapsed, 1e-6):.0f} в секунду)"
+        )
@@ -1,35 +1,115 @@
 import csv
+import json
 import os
+import time
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api.caching import bump_version
 from recipes.models import Ingredient, Tag
 
+BATCH_SIZE = 1000
 
-def find_data(csv_file):
-    """Найти и открыть нужный файл csv."""
-    csv_path = os.path.join(
-        settings.BASE_DIR, "data", csv_file
-    )
-    return csv.reader(open(csv_path, "r", encoding="utf-8"), delimiter=",")
+
+def find_data(file_name):
+    """Найти нужный файл с данными."""
+    return os.path.join(settings.BASE_DIR, "data", file_name)
+
+
+def read_rows(path, fields):
+    """Построчно прочитать csv или json файл в словари с полями fields."""
+    with open(path, "r", encoding="utf-8") as file:
+        if path.endswith(".json"):
+            for item in json.load(file):
+                yield {field: item[field] for field in fields}
+            return
+        for row in csv.reader(file, delimiter=","):
+            if row:
+                yield dict(zip(fields, row))
+
+
+def batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
 
 
 class Command(BaseCommand):
-    help = "Импортирует данные из csv файлов."
+    help = "Импортирует ингредиенты и теги из csv или json файлов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ingredients",
+            default="ingredients.csv",
+            help="Файл ингредиентов в data/ (.csv или .json).",
+        )
+        parser.add_argument(
+            "--tags",
+            default="tags.csv",
+            help="Файл тегов в data/ (.csv или .json).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Количество строк в одном INSERT.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Прочитать файлы и откатить изменения.",
+        )
 
     def handle(self, *args, **options):
-        reader = find_data("ingredients.csv")
-        for row in reader:
-            data, status = Ingredient.objects.get_or_create(
-                name=row[0],
-                measurement_unit=row[1],
-            )
-        reader = find_data("tags.csv")
-        for row in reader:
-            data, status = Tag.objects.get_or_create(
-                name=row[0],
-                color=row[1],
-                slug=row[2],
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть больше нуля.")
+        try:
+            with transaction.atomic():
+                self.load(
+                    Ingredient,
+                    options["ingredients"],
+                    ("name", "measurement_unit"),
+                    options["batch_size"],
+                    ignore_conflicts=True,
+                )
+                self.load(
+                    Tag,
+                    options["tags"],
+                    ("name", "color", "slug"),
+                    options["batch_size"],
+                    update_conflicts=True,
+                    unique_fields=("slug",),
+                    update_fields=("name", "color"),
+                )
+                if options["dry_run"]:
+                    transaction.set_rollback(True)
+        except OSError as error:
+            raise CommandError(f"Не удалось прочитать файл: {error}")
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Изменения отменены."))
+        else:
+            # bulk_create не посылает post_save: сбрасываем кэш справочников.
+            bump_version(Ingredient)
+            bump_version(Tag)
+            self.stdout.write(self.style.SUCCESS("Данные загружены!"))
+
+    def load(self, model, file_name, fields, batch_size, **conflicts):
+        started = time.monotonic()
+        total = 0
+        rows = read_rows(find_data(file_name), fields)
+        for batch in batches(rows, batch_size):
+            model.objects.bulk_create(
+                (model(**row) for row in batch), **conflicts
             )
-        self.stdout.write(self.style.SUCCESS("Данные загружены!"))
+            total += len(batch)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{model._meta.verbose_name_plural}: {total} строк "
+            f"за {elapsed:.2f} с ({total / max(elapsed, 1e-6):.0f} строк/с)"
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Строит копии изображений рецептов, которые не обработал фоновый "
+        "пул (например, из-за перезапуска процесса)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Перестроить копии всех рецептов, а не только без копий.",
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="")
+        if not options["all"]:
+            recipes = recipes.filter(image_renditions={})
+        ids = list(recipes.values_list("id", flat=True))
+        for recipe_id in ids:
+            process_recipe_image(recipe_id)
+        missing = Recipe.objects.filter(
+            id__in=ids, image_renditions={}
+        ).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано изображений: {len(ids) - missing} из {len(ids)}."
+        ))
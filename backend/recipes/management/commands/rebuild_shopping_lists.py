@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает сводные списки покупок по корзинам пользователей."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Только сверить списки с корзинами, ничего не меняя.",
+        )
+
+    def handle(self, *args, **options):
+        expected = ShoppingListItem.calculate()
+        if options["verify"]:
+            return self.verify(expected)
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=amount,
+                )
+                for (user_id, ingredient_id), amount in expected.items()
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Списки покупок пересчитаны: {len(expected)} позиций."
+        ))
+
+    def verify(self, expected):
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.values_list(
+                "user_id", "ingredient_id", "amount"
+            )
+        }
+        mismatches = [
+            (key, stored.get(key), expected.get(key))
+            for key in stored.keys() | expected.keys()
+            if stored.get(key) != expected.get(key)
+        ]
+        for (user_id, ingredient_id), actual, amount in sorted(mismatches):
+            self.stdout.write(
+                f"Пользователь {user_id}, ингредиент {ingredient_id}: "
+                f"в списке {actual}, по корзине {amount}"
+            )
+        if mismatches:
+            raise CommandError(
+                f"Расхождений в списках покупок: {len(mismatches)}."
+            )
+        self.stdout.write(self.style.SUCCESS("Списки покупок совпадают."))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+def count_related(model):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(recipe=OuterRef("pk")).values(
+                "recipe"
+            ).annotate(count=Count("id")).values("count")
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Сверяет счётчики избранного и корзин рецептов и исправляет их."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать количество расхождений.",
+        )
+
+    def handle(self, *args, **options):
+        drifted = Recipe.objects.annotate(
+            actual_favorites=count_related(Favorite),
+            actual_in_carts=count_related(ShoppingCart),
+        ).filter(
+            ~Q(favorites_count=F("actual_favorites"))
+            | ~Q(in_carts_count=F("actual_in_carts"))
+        ).values_list("id", flat=True)
+        ids = list(drifted)
+        if not options["dry_run"] and ids:
+            Recipe.objects.filter(id__in=ids).update(
+                favorites_count=count_related(Favorite),
+                in_carts_count=count_related(ShoppingCart),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Рецептов с расхождениями: {len(ids)}."
+        ))
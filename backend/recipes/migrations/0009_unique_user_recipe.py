@@ -0,0 +1,80 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:49
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_related(model):
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(recipe=models.OuterRef('pk')).values(
+                'recipe'
+            ).annotate(count=models.Count('id')).values('count')
+        ),
+        0
+    )
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Ограничение раньше не создавалось: оставляем по одной записи на
+    пару (user, recipe) и пересчитываем зависящие от них данные.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    deleted = 0
+    for model in (Favorite, ShoppingCart):
+        keep = model.objects.values('user', 'recipe').annotate(
+            keep_id=models.Min('id')
+        ).values('keep_id')
+        deleted += model.objects.exclude(id__in=keep).delete()[0]
+    if not deleted:
+        return
+    Recipe.objects.update(
+        favorites_count=count_related(Favorite),
+        in_carts_count=count_related(ShoppingCart),
+    )
+    ShoppingListItem.objects.all().delete()
+    rows = RecipeIngredient.objects.filter(
+        recipe__shopping_carts__isnull=False
+    ).values(
+        'ingredient_id', user_id=models.F('recipe__shopping_carts__user')
+    ).annotate(total=models.Sum('amount'))
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=row['user_id'],
+            ingredient_id=row['ingredient_id'],
+            amount=row['total']
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='favorite',
+            options={'default_related_name': 'favorite_recipes', 'ordering': ('id',), 'verbose_name': 'Избранное', 'verbose_name_plural': 'Избранные'},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppingcart',
+            options={'default_related_name': 'shopping_carts', 'ordering': ('id',), 'verbose_name': 'Корзина покупок', 'verbose_name_plural': 'Корзины покупок'},
+        ),
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='favorite_unique_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='shoppingcart_unique_user_recipe'),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+MAX_AMOUNT = 32000
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Повторы ингредиента в рецепте сливаются в одну строку с суммарным
+    количеством. Сумма больше MAX_AMOUNT не помещается в поле amount
+    и обрезается до MAX_AMOUNT: такие рецепты после миграции содержат
+    меньше ингредиента, чем раньше. Списки покупок пользователей,
+    у которых они в корзине, уменьшаются на обрезанный остаток
+    и продолжают совпадать с рецептами.
+    """
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = list(
+        RecipeIngredient.objects.values('recipe', 'ingredient').annotate(
+            keep_id=models.Min('id'),
+            total=models.Sum('amount'),
+            count=models.Count('id'),
+        ).filter(count__gt=1)
+    )
+    for row in duplicates:
+        RecipeIngredient.objects.filter(
+            recipe=row['recipe'], ingredient=row['ingredient']
+        ).exclude(id=row['keep_id']).delete()
+        RecipeIngredient.objects.filter(id=row['keep_id']).update(
+            amount=min(row['total'], MAX_AMOUNT)
+        )
+        excess = row['total'] - MAX_AMOUNT
+        if excess > 0:
+            ShoppingListItem.objects.filter(
+                user__in=ShoppingCart.objects.filter(
+                    recipe=row['recipe']
+                ).values('user'),
+                ingredient=row['ingredient'],
+            ).update(amount=models.F('amount') - excess)
+
+
+class Migration(migrations.Migration):
+    """
+    Составные индексы под запросы API. Индексы внешних ключей, которые
+    совпадают с началом новых индексов, удаляются после их создания.
+    """
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_unique_user_recipe'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='shoppingcart_recipe_user_idx'),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_list', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglistitem',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+    ]
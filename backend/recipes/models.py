@@ -1,4 +1,6 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, connections, models, router, transaction
+from django.db.models.functions import Greatest
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 from users.models import CustomUser
@@ -8,6 +10,8 @@ MAX_LEN_COLOR = 7
 MIN_COOKING_TIME = AMOUNT_MIN_VALUE = 1
 MAX_COOKING_TIME = AMOUNT_MAХ_VALUE = 32000
 MAX_LEN_RECIPE_TEXT = 2000
+SEARCH_CONFIG = 'russian'
+UPSERT_BATCH_SIZE = 1000
 (
     MAX_LEN_TAG_NAME,
     MAX_LEN_TAG_SLUG,
@@ -71,11 +75,14 @@ class Ingredient(models.Model):
 
 
 class Recipe(models.Model):
+    # Отдельные индексы внешних ключей не нужны там, где поле стоит
+    # первым в составном индексе или ограничении уникальности.
     author = models.ForeignKey(
         CustomUser,
         verbose_name='Автор рецепта',
         on_delete=models.CASCADE,
-        related_name='recipes'
+        related_name='recipes',
+        db_index=False
     )
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -107,26 +114,82 @@ class Recipe(models.Model):
             MaxValueValidator(MAX_COOKING_TIME),
         ],
     )
+    image_renditions = models.JSONField(
+        'Копии изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     pub_date = models.DateTimeField(
         'Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            # Фильтр по автору и рецепты авторов в подписках.
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date'),
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=('-in_carts_count', '-pub_date'),
+                name='recipe_in_carts_count_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name[:MAX_LEN_STR]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if connection.vendor == 'postgresql':
+            Recipe.objects.filter(pk=self.pk).update(
+                search_vector=recipe_search_vector()
+            )
+
+
+def recipe_search_vector():
+    """Название рецепта весит больше описания."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         verbose_name='Рецепт',
         on_delete=models.CASCADE,
-        related_name='ingredient_list'
+        related_name='ingredient_list',
+        db_index=False
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -146,6 +209,12 @@ class RecipeIngredient(models.Model):
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецепта'
         ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.ingredient}: {self.amount}'
@@ -155,12 +224,14 @@ class ShoppingFavoriteModel(models.Model):
     user = models.ForeignKey(
         CustomUser,
         verbose_name='Пользователь',
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
         verbose_name='Рецепт',
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
 
     class Meta:
@@ -169,14 +240,21 @@ class ShoppingFavoriteModel(models.Model):
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
-                name='unique_user_recipe'
+                name='%(class)s_unique_user_recipe'
             )
         ]
+        indexes = [
+            # Обратная сторона: счётчики рецепта и корзины в списках покупок.
+            models.Index(
+                fields=['recipe', 'user'],
+                name='%(class)s_recipe_user_idx'
+            ),
+        ]
 
 
 class ShoppingCart(ShoppingFavoriteModel):
 
-    class Meta:
+    class Meta(ShoppingFavoriteModel.Meta):
         verbose_name = 'Корзина покупок'
         verbose_name_plural = 'Корзины покупок'
         default_related_name = 'shopping_carts'
@@ -190,7 +268,7 @@ class ShoppingCart(ShoppingFavoriteModel):
 
 class Favorite(ShoppingFavoriteModel):
 
-    class Meta:
+    class Meta(ShoppingFavoriteModel.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
         default_related_name = 'favorite_recipes'
@@ -200,3 +278,157 @@ class Favorite(ShoppingFavoriteModel):
             f'{self.user[:MAX_LEN_STR]}: '
             f'{self.recipe[:MAX_LEN_STR]}'
         )
+
+
+class ShoppingListItem(models.Model):
+    """
+    Сводный список покупок пользователя: суммарное количество
+    каждого ингредиента по всем рецептам из его корзины.
+    """
+
+    user = models.ForeignKey(
+        CustomUser,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        db_index=False
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        default_related_name = 'shopping_list'
+        ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+    @classmethod
+    def apply(cls, user_ids, amounts):
+        """
+        Прибавить к спискам покупок пользователей количества
+        {id ингредиента: изменение}; отрицательное изменение вычитается,
+        позиции с нулевым остатком удаляются.
+        """
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not amounts:
+            return
+        # Один порядок блокировок строк у всех запросов.
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+        added = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount > 0
+        }
+        removed = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount < 0
+        }
+        with transaction.atomic():
+            if added:
+                cls.upsert(user_ids, added)
+            if removed:
+                items = cls.objects.filter(
+                    user_id__in=user_ids, ingredient_id__in=removed
+                )
+                items.update(amount=Greatest(
+                    models.F('amount') + models.Case(
+                        *(
+                            models.When(ingredient_id=key, then=amount)
+                            for key, amount in removed.items()
+                        ),
+                        output_field=models.IntegerField()
+                    ),
+                    0
+                ))
+                items.filter(amount=0).delete()
+
+    @classmethod
+    def upsert(cls, user_ids, amounts):
+        """
+        Прибавить положительные количества одним INSERT ... ON CONFLICT
+        DO UPDATE на пачку: первое одновременное добавление одной
+        позиции не падает на unique_shopping_list_item.
+        """
+        opts = cls._meta
+        connection = connections[router.db_for_write(cls)]
+        quote = connection.ops.quote_name
+        table = quote(opts.db_table)
+        user, ingredient, amount = (
+            quote(opts.get_field(name).column)
+            for name in ('user', 'ingredient', 'amount')
+        )
+        rows = [
+            (user_id, ingredient_id, value)
+            for user_id in user_ids
+            for ingredient_id, value in sorted(amounts.items())
+        ]
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+                batch = rows[start:start + UPSERT_BATCH_SIZE]
+                cursor.execute(
+                    f'INSERT INTO {table} ({user}, {ingredient}, {amount}) '
+                    f'VALUES {", ".join(["(%s, %s, %s)"] * len(batch))} '
+                    f'ON CONFLICT ({user}, {ingredient}) DO UPDATE '
+                    f'SET {amount} = {table}.{amount} + EXCLUDED.{amount}',
+                    [value for row in batch for value in row]
+                )
+
+    @staticmethod
+    def recipes_amounts(recipes):
+        """Суммарные количества ингредиентов нескольких рецептов."""
+        return dict(
+            RecipeIngredient.objects.filter(recipe__in=recipes).values(
+                'ingredient_id'
+            ).annotate(total=models.Sum('amount')).values_list(
+                'ingredient_id', 'total'
+            )
+        )
+
+    @classmethod
+    def add_recipes(cls, user_ids, recipes):
+        if recipes:
+            cls.apply(user_ids, cls.recipes_amounts(recipes))
+
+    @classmethod
+    def remove_recipes(cls, user_ids, recipes):
+        if recipes:
+            cls.apply(user_ids, {
+                ingredient_id: -amount
+                for ingredient_id, amount
+                in cls.recipes_amounts(recipes).items()
+            })
+
+    @classmethod
+    def calculate(cls, users=None):
+        """Посчитать списки покупок заново по корзинам пользователей."""
+        if users is None:
+            queryset = RecipeIngredient.objects.filter(
+                recipe__shopping_carts__isnull=False
+            )
+        else:
+            queryset = RecipeIngredient.objects.filter(
+                recipe__shopping_carts__user__in=users
+            )
+        return {
+            (row['user_id'], row['ingredient_id']): row['total']
+            for row in queryset.values(
+                'ingredient_id',
+                user_id=models.F('recipe__shopping_carts__user')
+            ).annotate(total=models.Sum('amount'))
+        }
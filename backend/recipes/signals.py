@@ -0,0 +1,153 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F, QuerySet
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from recipes.images import discard_renditions
+from recipes.models import (
+    Favorite, Recipe, RecipeIngredient, ShoppingCart, ShoppingListItem
+)
+
+COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+ingredient_changes_applied = ContextVar(
+    'ingredient_changes_applied', default=False
+)
+
+
+@contextmanager
+def shopping_lists_updated_by_caller():
+    """
+    Сохранение и удаление RecipeIngredient внутри блока не меняют
+    списки покупок: вызывающий код сам применяет все изменения состава
+    одним ShoppingListItem.apply(). В отличие от отключения сигналов
+    действует только в текущем потоке.
+    """
+    token = ingredient_changes_applied.set(True)
+    try:
+        yield
+    finally:
+        ingredient_changes_applied.reset(token)
+
+
+def deleted_with(origin, model):
+    """Удаление начато с объекта или QuerySet модели model."""
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+def cart_user_ids(recipe_id):
+    return ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+        'user_id', flat=True
+    )
+
+
+def recipes_added(model, user_id, recipe_ids):
+    """Счётчики рецептов и список покупок после добавления рецептов."""
+    counter = COUNTERS[model]
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        **{counter: F(counter) + 1}
+    )
+    if model is ShoppingCart:
+        ShoppingListItem.add_recipes([user_id], recipe_ids)
+
+
+def recipes_removed(model, user_id, recipe_ids):
+    """Счётчики рецептов и список покупок после удаления рецептов."""
+    counter = COUNTERS[model]
+    Recipe.objects.filter(
+        id__in=recipe_ids, **{f'{counter}__gt': 0}
+    ).update(**{counter: F(counter) - 1})
+    if model is ShoppingCart:
+        ShoppingListItem.remove_recipes([user_id], recipe_ids)
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_previous(sender, instance, raw, **kwargs):
+    """Прежнее состояние строки, чтобы учесть её изменение (админка)."""
+    instance._previous = None
+    if instance.pk is not None and not raw:
+        instance._previous = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def user_recipe_saved(sender, instance, created, raw, **kwargs):
+    """bulk_create не посылает post_save: такие места обновляют сами."""
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous is not None and (
+        (previous.user_id, previous.recipe_id)
+        != (instance.user_id, instance.recipe_id)
+    ):
+        recipes_removed(sender, previous.user_id, [previous.recipe_id])
+        recipes_added(sender, instance.user_id, [instance.recipe_id])
+    elif created:
+        recipes_added(sender, instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=Favorite)
+@receiver(pre_delete, sender=ShoppingCart)
+def user_recipe_deleted(sender, instance, origin, **kwargs):
+    """
+    Срабатывает и для QuerySet.delete(), и для каскадного удаления,
+    пока рецепт и его ингредиенты ещё в базе. Удаляемый рецепт
+    убирает себя из списков покупок сам, одним пересчётом.
+    """
+    if not deleted_with(origin, Recipe):
+        recipes_removed(sender, instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, origin, **kwargs):
+    if deleted_with(origin, Recipe):
+        ShoppingListItem.remove_recipes(
+            cart_user_ids(instance.id), [instance]
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    discard_renditions(instance.image_renditions)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, raw, **kwargs):
+    """Изменение состава рецепта в обход API, например в админке."""
+    if raw or ingredient_changes_applied.get():
+        return
+    changes = defaultdict(Counter)
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        changes[previous.recipe_id][previous.ingredient_id] -= (
+            previous.amount
+        )
+    changes[instance.recipe_id][instance.ingredient_id] += instance.amount
+    for recipe_id, amounts in changes.items():
+        ShoppingListItem.apply(cart_user_ids(recipe_id), amounts)
+
+
+@receiver(pre_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, origin, **kwargs):
+    # Вместе с рецептом или автором списки пересчитывают обработчики
+    # корзин, вместе с ингредиентом его позиции удаляются каскадом.
+    if (
+        deleted_with(origin, RecipeIngredient)
+        and not ingredient_changes_applied.get()
+    ):
+        ShoppingListItem.apply(
+            cart_user_ids(instance.recipe_id),
+            {instance.ingredient_id: -instance.amount}
+        )
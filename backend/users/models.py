@@ -1,9 +1,31 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
+from django.dispatch import Signal
 
 MAX_LEN_STR = 15
 MAX_LEN_USER = 150
+# Поля, после массового изменения которых сбрасываются кэши токенов.
+AUTH_FIELDS = ('is_active', 'password')
+
+# QuerySet.update() не отправляет post_save: сигнал сообщает id
+# пользователей, у которых так изменились AUTH_FIELDS.
+auth_fields_updated = Signal()
+
+
+class CustomUserQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        if not any(field in kwargs for field in AUTH_FIELDS):
+            return super().update(**kwargs)
+        user_ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        auth_fields_updated.send(sender=self.model, user_ids=user_ids)
+        return rows
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
 
 
 class CustomUser(AbstractUser):
@@ -30,6 +52,8 @@ class CustomUser(AbstractUser):
         blank=False,
     )
 
+    objects = CustomUserManager()
+
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
@@ -44,7 +68,9 @@ class Subscription(models.Model):
         CustomUser,
         verbose_name='Подписчик',
         on_delete=models.CASCADE,
-        related_name='subscribers'
+        related_name='subscribers',
+        # Поиск по подписчику идёт по unique_subscription.
+        db_index=False
     )
     author = models.ForeignKey(
         CustomUser,
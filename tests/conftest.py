@@ -0,0 +1,101 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import Subscription
+
+RECIPES_COUNT = 12
+RECIPE_INGREDIENTS = 3
+
+
+def make_user(django_user_model, name):
+    return django_user_model.objects.create_user(
+        email=f'{name}@foodgram.ru',
+        username=name,
+        first_name=name,
+        last_name=name,
+        password='password',
+    )
+
+
+def png(color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def base64_png(color='red'):
+    return f'data:image/png;base64,{base64.b64encode(png(color)).decode()}'
+
+
+@pytest.fixture
+def media(settings, tmp_path):
+    """Файлы в каталоге теста, копии изображений строятся сразу."""
+    settings.MEDIA_ROOT = tmp_path
+    settings.IMAGE_PIPELINE_ASYNC = False
+
+
+@pytest.fixture
+def user(django_user_model):
+    return make_user(django_user_model, 'user')
+
+
+@pytest.fixture
+def author(django_user_model):
+    return make_user(django_user_model, 'author')
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def tags():
+    return [
+        Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}', slug=f't{i}')
+        for i in range(2)
+    ]
+
+
+@pytest.fixture
+def ingredients():
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+        for i in range(RECIPE_INGREDIENTS * 2)
+    )
+
+
+@pytest.fixture
+def recipes(user, author, tags, ingredients):
+    """Рецепты двух авторов, на одного из них подписан user."""
+    Subscription.objects.create(user=user, author=author)
+    recipes = []
+    for number in range(RECIPES_COUNT):
+        recipe = Recipe.objects.create(
+            author=author if number % 2 else user,
+            name=f'Рецепт {number}',
+            text='Описание',
+            cooking_time=10,
+            image='recipes/test.png',
+        )
+        recipe.tags.set(tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in ingredients[
+                number % 2:number % 2 + RECIPE_INGREDIENTS
+            ]
+        )
+        recipes.append(recipe)
+    return recipes
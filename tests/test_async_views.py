@@ -0,0 +1,155 @@
+import importlib
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncClient
+from django.urls import clear_url_caches
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+import api.urls
+import foodgram_backend.urls
+from api import async_views
+from api.views import RecipeViewSet
+from recipes.models import Favorite, ShoppingCart
+
+
+def reload_urls():
+    # Пути асинхронного чтения выбираются при импорте api.urls.
+    importlib.reload(api.urls)
+    importlib.reload(foodgram_backend.urls)
+    clear_url_caches()
+
+
+def get_both(settings, path, user=None, accept='application/json'):
+    """Ответы синхронного DRF и асинхронного чтения на один запрос."""
+    headers = {'Accept': accept}
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        headers['Authorization'] = f'Token {token.key}'
+    cache.clear()
+    expected = APIClient().get(path, headers=headers)
+    cache.clear()
+    settings.ASYNC_READ_API = True
+    reload_urls()
+    try:
+        response = async_to_sync(AsyncClient().get)(path, headers=headers)
+    finally:
+        settings.ASYNC_READ_API = False
+        reload_urls()
+    return expected, response
+
+
+def assert_same(settings, path, user=None):
+    expected, response = get_both(settings, path, user)
+    assert response.status_code == expected.status_code
+    assert response['Content-Type'] == expected['Content-Type']
+    assert json.loads(response.content) == json.loads(expected.content)
+    return json.loads(response.content)
+
+
+@pytest.fixture
+def list_calls(monkeypatch):
+    """Вьюсеты, списки которых собрало асинхронное представление."""
+    calls = []
+    list_data = async_views.list_data
+
+    async def spy(viewset_class, request):
+        calls.append(viewset_class)
+        return await list_data(viewset_class, request)
+
+    monkeypatch.setattr(async_views, 'list_data', spy)
+    return calls
+
+
+@pytest.fixture
+def marked(user, recipes):
+    """Рецепты в избранном и корзине user."""
+    Favorite.objects.create(user=user, recipe=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe=recipes[1])
+    return recipes
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path', [
+    '/api/recipes/',
+    '/api/recipes/?page=2&limit=5',
+    '/api/recipes/?tags=t0&is_favorited=1',
+])
+def test_recipe_list(settings, user, marked, path):
+    assert_same(settings, path, user)
+    assert_same(settings, path)
+
+
+@pytest.mark.django_db
+def test_recipe_list_user_fields(settings, user, marked, list_calls):
+    data = assert_same(settings, '/api/recipes/?limit=20', user)
+    assert list_calls == [RecipeViewSet]
+    fields = {
+        recipe['id']: (recipe['is_favorited'], recipe['is_in_shopping_cart'])
+        for recipe in data['results']
+    }
+    assert fields[marked[0].id] == (True, False)
+    assert fields[marked[1].id] == (False, True)
+
+
+@pytest.mark.django_db
+def test_recipe_detail(settings, user, marked):
+    data = assert_same(settings, f'/api/recipes/{marked[0].id}/', user)
+    assert data['is_favorited'] is True
+    assert_same(settings, f'/api/recipes/{marked[0].id}/')
+
+
+@pytest.mark.django_db
+def test_recipe_not_found(settings, user, recipes):
+    assert_same(settings, '/api/recipes/0/', user)
+
+
+@pytest.mark.django_db
+def test_invalid_page(settings, recipes):
+    assert_same(settings, '/api/recipes/?page=100')
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path', [
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/ingredients/?name=Ингредиент 1',
+])
+def test_reference_lists(settings, recipes, path):
+    assert_same(settings, path)
+
+
+@pytest.mark.django_db
+def test_reference_details(settings, tags, ingredients):
+    assert_same(settings, f'/api/tags/{tags[0].id}/')
+    assert_same(settings, f'/api/ingredients/{ingredients[0].id}/')
+    assert_same(settings, '/api/tags/0/')
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path', [
+    '/api/users/subscriptions/',
+    '/api/users/subscriptions/?recipes_limit=2',
+    '/api/users/subscriptions/?recipes_limit=0',
+])
+def test_subscriptions(settings, user, recipes, path):
+    assert_same(settings, path, user)
+
+
+@pytest.mark.django_db
+def test_subscriptions_anonymous(settings, recipes):
+    assert_same(settings, '/api/users/subscriptions/')
+
+
+@pytest.mark.django_db
+def test_browsable_api_uses_sync_views(settings, user, recipes, list_calls):
+    expected, response = get_both(
+        settings, '/api/recipes/', user, accept='text/html'
+    )
+    assert response.status_code == expected.status_code == 200
+    assert response['Content-Type'].startswith('text/html')
+    assert user.username in response.content.decode()
+    assert list_calls == []
@@ -0,0 +1,96 @@
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from recipes.models import Ingredient, Tag
+
+INGREDIENTS = [('мука', 'г'), ('молоко', 'мл'), ('яйца', 'шт')]
+TAGS = [('Завтрак', '#E26C2D', 'breakfast'), ('Обед', '#49B64E', 'lunch')]
+
+
+@pytest.fixture
+def data_dir(settings, tmp_path):
+    """Каталог data/ с файлами ингредиентов и тегов в csv и json."""
+    settings.BASE_DIR = tmp_path
+    data = tmp_path / 'data'
+    data.mkdir()
+    (data / 'ingredients.csv').write_text(
+        ''.join(f'{name},{unit}\n' for name, unit in INGREDIENTS),
+        encoding='utf-8'
+    )
+    (data / 'tags.csv').write_text(
+        ''.join(f'{name},{color},{slug}\n' for name, color, slug in TAGS),
+        encoding='utf-8'
+    )
+    (data / 'ingredients.json').write_text(json.dumps([
+        {'name': name, 'measurement_unit': unit}
+        for name, unit in INGREDIENTS
+    ]), encoding='utf-8')
+    return data
+
+
+def import_csv(**options):
+    call_command('import_csv', stdout=io.StringIO(), **options)
+
+
+def stored():
+    return (
+        sorted(Ingredient.objects.values_list('name', 'measurement_unit')),
+        sorted(Tag.objects.values_list('name', 'color', 'slug')),
+    )
+
+
+@pytest.mark.django_db
+def test_import(data_dir):
+    import_csv()
+    assert stored() == (sorted(INGREDIENTS), sorted(TAGS))
+
+
+@pytest.mark.django_db
+def test_repeat_import_changes_nothing(data_dir):
+    import_csv()
+    ids = sorted(Ingredient.objects.values_list('id', flat=True))
+    import_csv(batch_size=2)
+    assert stored() == (sorted(INGREDIENTS), sorted(TAGS))
+    assert sorted(Ingredient.objects.values_list('id', flat=True)) == ids
+
+
+@pytest.mark.django_db
+def test_repeat_import_updates_tags(data_dir):
+    import_csv()
+    (data_dir / 'tags.csv').write_text(
+        'Ранний завтрак,#000000,breakfast\n', encoding='utf-8'
+    )
+    import_csv()
+    assert Tag.objects.get(slug='breakfast').color == '#000000'
+    assert Tag.objects.count() == len(TAGS)
+
+
+@pytest.mark.django_db
+def test_json_input(data_dir):
+    import_csv(ingredients='ingredients.json')
+    assert stored()[0] == sorted(INGREDIENTS)
+
+
+@pytest.mark.django_db
+def test_dry_run(data_dir):
+    out = io.StringIO()
+    call_command('import_csv', dry_run=True, stdout=out)
+    assert stored() == ([], [])
+    assert 'Изменения отменены.' in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_missing_file(data_dir):
+    with pytest.raises(CommandError, match='Не удалось прочитать файл'):
+        import_csv(ingredients='missing.csv')
+    assert stored() == ([], [])
+
+
+@pytest.mark.django_db
+def test_invalid_batch_size(data_dir):
+    with pytest.raises(CommandError):
+        import_csv(batch_size=0)
@@ -0,0 +1,87 @@
+import pytest
+
+from api.autocomplete import ingredient_index
+from api.views import AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT
+from recipes.models import Ingredient
+
+
+@pytest.fixture(autouse=True)
+def clear_index():
+    # bulk_create и откат транзакции теста не сбрасывают индекс.
+    ingredient_index.clear()
+    yield
+    ingredient_index.clear()
+
+
+def autocomplete(client, **params):
+    return client.get('/api/ingredients/autocomplete/', params)
+
+
+def names(response):
+    return [ingredient['name'] for ingredient in response.data]
+
+
+@pytest.fixture
+def milk():
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit='мл')
+        for name in (
+            'Сгущённое молоко', 'молоко', 'Кокосовое молоко',
+            'Молочная смесь', 'Мука',
+        )
+    )
+
+
+@pytest.fixture
+def salts():
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=f'Соль {number:02}', measurement_unit='г')
+        for number in range(MAX_AUTOCOMPLETE_LIMIT + 10)
+    )
+
+
+@pytest.mark.django_db
+def test_prefix_matches_go_first(client, milk):
+    response = autocomplete(client, name='Мол')
+    assert response.status_code == 200
+    assert set(names(response)[:2]) == {'Молочная смесь', 'молоко'}
+    assert set(names(response)[2:]) == {
+        'Кокосовое молоко', 'Сгущённое молоко'
+    }
+
+
+@pytest.mark.django_db
+def test_limit_cuts_contains_matches(client, milk):
+    response = autocomplete(client, name='мол', limit=3)
+    assert len(response.data) == 3
+    assert set(names(response)[:2]) == {'Молочная смесь', 'молоко'}
+
+
+@pytest.mark.django_db
+def test_blank_name(client, milk):
+    response = autocomplete(client, name=' ')
+    assert response.status_code == 200
+    assert response.data == []
+
+
+@pytest.mark.django_db
+def test_default_and_max_limit(client, salts):
+    assert len(autocomplete(client, name='Соль').data) == AUTOCOMPLETE_LIMIT
+    response = autocomplete(client, name='Соль', limit=MAX_AUTOCOMPLETE_LIMIT)
+    assert names(response) == [
+        ingredient.name for ingredient in salts[:MAX_AUTOCOMPLETE_LIMIT]
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', (0, -1, MAX_AUTOCOMPLETE_LIMIT + 1, 'abc'))
+def test_invalid_limit(client, salts, limit):
+    response = autocomplete(client, name='Соль', limit=limit)
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_index_follows_ingredient_changes(client, milk):
+    assert 'Молоко овсяное' not in names(autocomplete(client, name='мол'))
+    Ingredient.objects.create(name='Молоко овсяное', measurement_unit='мл')
+    assert 'Молоко овсяное' in names(autocomplete(client, name='мол'))
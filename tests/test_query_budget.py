@@ -0,0 +1,30 @@
+import json
+import logging
+
+import pytest
+
+
+@pytest.fixture
+def budget(settings):
+    settings.MIDDLEWARE = [
+        'api.middleware.QueryBudgetMiddleware', *settings.MIDDLEWARE
+    ]
+
+
+@pytest.mark.django_db
+def test_render_time_is_measured(client, recipes, budget, caplog):
+    with caplog.at_level(logging.INFO, logger='api.query_budget'):
+        response = client.get('/api/recipes/')
+    assert response.status_code == 200
+    phases = [
+        phase.split(';')[0]
+        for phase in response['Server-Timing'].split(', ')
+    ]
+    assert phases == ['db', 'render', 'app', 'total']
+    record = json.loads(caplog.records[-1].getMessage())
+    assert response.render_duration > 0
+    assert record['render_ms'] == round(response.render_duration * 1000, 1)
+    assert record['queries'] > 0
+    assert record['total_ms'] >= (
+        record['db_ms'] + record['render_ms'] + record['app_ms'] - 0.2
+    )
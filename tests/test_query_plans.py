@@ -0,0 +1,50 @@
+import pytest
+from django.db import connection
+
+from recipes.management.commands.check_query_plans import (
+    SCENARIOS, explain, index_names, scenario_context, scenarios
+)
+
+# Индексы миграций recipes 0005, 0010 и users 0002 (подписки
+# ищутся по unique_subscription вместо отдельного индекса user).
+MIGRATION_INDEXES = {
+    'recipe_pub_date_id_idx',
+    'recipe_author_pub_date_idx',
+    'favorite_recipe_user_idx',
+    'shoppingcart_recipe_user_idx',
+    'unique_recipe_ingredient',
+    'unique_subscription',
+}
+
+
+@pytest.mark.django_db
+def test_plan_scenarios_follow_api_querysets(recipes):
+    # На данных реального объёма индексы проверяет check_query_plans
+    # (шаг CI), здесь - что сценарии собираются из текущих вьюсетов.
+    context = scenario_context()
+    for name, build, indexes, vendors in scenarios():
+        assert explain(build(context)), name
+
+
+def test_scenarios_cover_migration_indexes():
+    checked = {index for _, _, indexes, _ in SCENARIOS for index in indexes}
+    assert MIGRATION_INDEXES <= checked
+
+
+@pytest.mark.skipif(
+    connection.vendor != 'postgresql', reason='Планы проверяются на PostgreSQL.'
+)
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'scenario', SCENARIOS, ids=[scenario[0] for scenario in SCENARIOS]
+)
+def test_plan_uses_index(recipes, scenario):
+    name, build, indexes, _ = scenario
+    with connection.cursor() as cursor:
+        # На нескольких строках планировщик выбрал бы полный просмотр.
+        cursor.execute('SET LOCAL enable_seqscan = off')
+    plan = explain(build(scenario_context()))
+    for index in indexes:
+        assert any(found in plan for found in index_names(index)), (
+            f'{name}: нет {index}\n{plan}'
+        )
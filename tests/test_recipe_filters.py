@@ -0,0 +1,119 @@
+import pytest
+
+from recipes.models import Recipe, Tag
+
+# Фильтр по тегам проверяет слаги отдельным запросом.
+FILTERED_LIST_QUERIES = 6
+
+
+def ids(response):
+    return [recipe['id'] for recipe in response.data['results']]
+
+
+def create_recipe(author, name, text):
+    return Recipe.objects.create(
+        author=author, name=name, text=text, cooking_time=10,
+        image='recipes/test.png',
+    )
+
+
+@pytest.fixture
+def soups(user, recipes):
+    """Рецепты со словом в названии и в описании, второй новее."""
+    in_name = create_recipe(user, 'Борщ домашний', 'Описание')
+    in_text = create_recipe(user, 'Суп', 'Почти как Борщ')
+    return in_name, in_text
+
+
+@pytest.mark.django_db
+def test_search_ranks_name_above_text(user_client, soups):
+    in_name, in_text = soups
+    response = user_client.get('/api/recipes/', {'search': 'Борщ'})
+    assert response.status_code == 200
+    assert ids(response) == [in_name.id, in_text.id]
+    assert response.data['count'] == 2
+
+
+@pytest.mark.django_db
+def test_search_without_matches(user_client, soups):
+    response = user_client.get('/api/recipes/', {'search': 'Плов'})
+    assert response.data['count'] == 0
+
+
+@pytest.mark.django_db
+def test_blank_search_is_ignored(user_client, soups):
+    response = user_client.get('/api/recipes/', {'search': ' '})
+    assert response.data['count'] == Recipe.objects.count()
+
+
+@pytest.mark.django_db
+def test_ingredients_filter(user_client, recipes, ingredients):
+    first, second = ingredients[0].id, ingredients[1].id
+    response = user_client.get(
+        '/api/recipes/', {'ingredients': str(first), 'limit': 20}
+    )
+    assert set(ids(response)) == {recipe.id for recipe in recipes[::2]}
+    response = user_client.get(
+        '/api/recipes/', {'ingredients': f'{second},-{first}', 'limit': 20}
+    )
+    assert set(ids(response)) == {recipe.id for recipe in recipes[1::2]}
+    response = user_client.get(
+        '/api/recipes/', {'ingredients': f'{first},{ingredients[4].id}'}
+    )
+    assert response.data['count'] == 0
+
+
+@pytest.mark.django_db
+def test_invalid_ingredients(user_client, recipes):
+    response = user_client.get('/api/recipes/', {'ingredients': '1,a'})
+    assert response.status_code == 400
+    assert 'ingredients' in response.data
+
+
+@pytest.mark.django_db
+def test_filters_combine_with_tags(user_client, recipes, ingredients, soups):
+    in_name, in_text = soups
+    tag = Tag.objects.create(name='Супы', color='#0000AA', slug='soup')
+    for recipe in (in_name, in_text, recipes[0], recipes[1]):
+        recipe.tags.add(tag)
+    response = user_client.get('/api/recipes/', {
+        'tags': 'soup', 'search': 'Борщ'
+    })
+    assert ids(response) == [in_name.id, in_text.id]
+    response = user_client.get('/api/recipes/', {
+        'tags': 'soup', 'ingredients': ingredients[0].id
+    })
+    assert ids(response) == [recipes[0].id]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', (1, 5, 12))
+def test_filtered_list_queries(
+    user_client, recipes, ingredients, soups, django_assert_num_queries,
+    limit
+):
+    with django_assert_num_queries(FILTERED_LIST_QUERIES):
+        response = user_client.get('/api/recipes/', {
+            'tags': 't0',
+            'search': 'Рецепт',
+            'ingredients': f'{ingredients[1].id},-{ingredients[4].id}',
+            'limit': limit,
+        })
+    assert response.status_code == 200
+    assert len(response.data['results']) == limit
+
+
+@pytest.mark.django_db
+def test_recipe_with_several_requested_tags_is_listed_once(
+    user_client, recipes
+):
+    seen = []
+    page = 1
+    while page:
+        response = user_client.get('/api/recipes/', {
+            'tags': ['t0', 't1'], 'limit': 5, 'page': page
+        })
+        assert response.data['count'] == len(recipes)
+        seen.extend(ids(response))
+        page = page + 1 if response.data['next'] else None
+    assert sorted(seen) == sorted(recipe.id for recipe in recipes)
@@ -0,0 +1,247 @@
+import base64
+import gc
+import io
+import sys
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from api.fields import Base64ImageField
+from conftest import base64_png, png
+from recipes import demo_data
+from recipes.models import Recipe
+
+pytestmark = pytest.mark.usefixtures('media')
+
+
+def rendition_paths(recipe):
+    recipe.refresh_from_db()
+    return [
+        path
+        for formats in recipe.image_renditions.values()
+        for path in formats.values()
+    ]
+
+
+@pytest.fixture
+def recipe(author):
+    return Recipe.objects.create(
+        author=author,
+        name='Рецепт',
+        text='Описание',
+        cooking_time=10,
+        image=default_storage.save(
+            'recipes/test.png', ContentFile(png('red'))
+        ),
+    )
+
+
+@pytest.mark.django_db
+def test_backfill_builds_missing_renditions(recipe):
+    assert rendition_paths(recipe) == []
+    call_command('process_recipe_images', stdout=io.StringIO())
+    paths = rendition_paths(recipe)
+    assert paths
+    assert all(default_storage.exists(path) for path in paths)
+
+
+@pytest.mark.django_db
+def test_backfill_all_replaces_renditions(recipe):
+    call_command('process_recipe_images', stdout=io.StringIO())
+    old_paths = rendition_paths(recipe)
+    call_command('process_recipe_images', all=True, stdout=io.StringIO())
+    new_paths = rendition_paths(recipe)
+    assert all(default_storage.exists(path) for path in new_paths)
+    assert not any(default_storage.exists(path) for path in old_paths)
+
+
+@pytest.mark.django_db
+def test_replacing_image_deletes_old_renditions(
+    recipe, author, tags, ingredients, django_capture_on_commit_callbacks
+):
+    call_command('process_recipe_images', stdout=io.StringIO())
+    old_paths = rendition_paths(recipe)
+    client = APIClient()
+    client.force_authenticate(author)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.patch(f'/api/recipes/{recipe.id}/', {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'tags': [tags[0].id],
+            'ingredients': [{'id': ingredients[0].id, 'amount': 5}],
+            'image': base64_png('blue'),
+        }, format='json')
+    assert response.status_code == 200, response.data
+    new_paths = rendition_paths(recipe)
+    assert new_paths
+    assert all(default_storage.exists(path) for path in new_paths)
+    assert not any(default_storage.exists(path) for path in old_paths)
+
+
+@pytest.mark.django_db
+def test_deleting_recipe_deletes_renditions(
+    recipe, django_capture_on_commit_callbacks
+):
+    call_command('process_recipe_images', stdout=io.StringIO())
+    paths = rendition_paths(recipe)
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.author.delete()
+    assert not any(default_storage.exists(path) for path in paths)
+
+
+@pytest.mark.django_db
+def test_large_base64_image_closes_temporary_file(
+    settings, author, tags, ingredients, monkeypatch
+):
+    settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 10
+    unraisable = []
+    monkeypatch.setattr(sys, 'unraisablehook', unraisable.append)
+    client = APIClient()
+    client.force_authenticate(author)
+    response = client.post('/api/recipes/', {
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'tags': [tags[0].id],
+        'ingredients': [{'id': ingredients[0].id, 'amount': 5}],
+        'image': base64_png(),
+    }, format='json')
+    assert response.status_code == 201, response.data
+    del response
+    gc.collect()
+    assert unraisable == []
+
+
+@pytest.mark.django_db
+def test_demo_recipes_get_renditions():
+    call_command(
+        'generate_demo_data', users=2, recipes=3, workers=1,
+        stdout=io.StringIO()
+    )
+    assert default_storage.exists(demo_data.DEMO_IMAGE)
+    call_command('process_recipe_images', stdout=io.StringIO())
+    for recipe in Recipe.objects.all():
+        assert rendition_paths(recipe)
+
+
+def recipe_payload(tags, ingredients, image):
+    return {
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'tags': [tags[0].id],
+        'ingredients': [{'id': ingredients[0].id, 'amount': 5}],
+        'image': image,
+    }
+
+
+def multipart_payload(tags, ingredients, image):
+    # Вложенные ингредиенты в форме - в нотации DRF ingredients[0]id.
+    return {
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'tags': [tags[0].id],
+        'ingredients[0]id': ingredients[0].id,
+        'ingredients[0]amount': 5,
+        'image': image,
+    }
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+@pytest.mark.django_db
+def test_multipart_image_upload(author_client, tags, ingredients):
+    response = author_client.post('/api/recipes/', multipart_payload(
+        tags, ingredients, SimpleUploadedFile('photo.png', png(), 'image/png')
+    ), format='multipart')
+    assert response.status_code == 201, response.data
+    recipe = Recipe.objects.get()
+    with default_storage.open(recipe.image.name) as file:
+        assert file.read() == png()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('image, error', (
+    ('data:image/svg+xml;base64,PHN2Zz48L3N2Zz4=', 'image_type'),
+    ('data:image/bmp;base64,Qk0=', 'image_type'),
+    (f'data:image/png;base64,{"!" * 8}', 'base64'),
+    (base64_png()[:-3], 'base64'),
+))
+def test_invalid_base64_image(author_client, tags, ingredients, image, error):
+    response = author_client.post(
+        '/api/recipes/', recipe_payload(tags, ingredients, image),
+        format='json'
+    )
+    assert response.status_code == 400
+    assert response.data['image'] == [
+        Base64ImageField.default_error_messages[error]
+    ]
+    assert not Recipe.objects.exists()
+
+
+@pytest.mark.django_db
+def test_base64_not_an_image(author_client, tags, ingredients):
+    image = f'data:image/png;base64,{base64.b64encode(b"text").decode()}'
+    response = author_client.post(
+        '/api/recipes/', recipe_payload(tags, ingredients, image),
+        format='json'
+    )
+    assert response.status_code == 400
+    assert 'image' in response.data
+
+
+@pytest.mark.django_db
+def test_base64_size_limit(settings, author_client, tags, ingredients):
+    settings.RECIPE_IMAGE_MAX_SIZE = len(png()) - 1
+    response = author_client.post(
+        '/api/recipes/', recipe_payload(tags, ingredients, base64_png()),
+        format='json'
+    )
+    assert response.status_code == 400
+    assert response.data['image'] == [
+        Base64ImageField.default_error_messages['image_size'].format(
+            max_size=settings.RECIPE_IMAGE_MAX_SIZE
+        )
+    ]
+    settings.RECIPE_IMAGE_MAX_SIZE = len(png())
+    response = author_client.post(
+        '/api/recipes/', recipe_payload(tags, ingredients, base64_png()),
+        format='json'
+    )
+    assert response.status_code == 201, response.data
+
+
+@pytest.mark.django_db
+def test_multipart_size_limit(settings, author_client, tags, ingredients):
+    settings.RECIPE_IMAGE_MAX_SIZE = len(png()) - 1
+    response = author_client.post('/api/recipes/', multipart_payload(
+        tags, ingredients, SimpleUploadedFile('photo.png', png(), 'image/png')
+    ), format='multipart')
+    assert response.status_code == 400
+    assert response.data['image'] == [
+        Base64ImageField.default_error_messages['image_size'].format(
+            max_size=settings.RECIPE_IMAGE_MAX_SIZE
+        )
+    ]
+
+
+@pytest.mark.django_db
+def test_multipart_not_an_image(author_client, tags, ingredients):
+    response = author_client.post('/api/recipes/', multipart_payload(
+        tags, ingredients,
+        SimpleUploadedFile('photo.png', b'text', 'image/png')
+    ), format='multipart')
+    assert response.status_code == 400
+    assert 'image' in response.data
+    assert not Recipe.objects.exists()
@@ -0,0 +1,26 @@
+import pytest
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', (
+    {}, {'ordering': '-pub_date'},
+))
+def test_cursor_with_publication_order(client, recipes, params):
+    response = client.get('/api/recipes/', {'cursor': '', **params})
+    assert response.status_code == 200
+    assert [recipe['id'] for recipe in response.data['results']] == [
+        recipe.id for recipe in reversed(recipes)
+    ][:10]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', (
+    {'ordering': '-favorites_count'},
+    {'ordering': 'pub_date'},
+    {'search': 'Рецепт'},
+))
+def test_cursor_rejects_other_orderings(client, recipes, params):
+    response = client.get('/api/recipes/', {'cursor': '', **params})
+    assert response.status_code == 400
+    assert 'cursor' in response.data
+    assert client.get('/api/recipes/', params).status_code == 200
@@ -0,0 +1,131 @@
+import pytest
+from django.db import DatabaseError
+
+from conftest import base64_png
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+# Число запросов не зависит от размера страницы: теги, ингредиенты
+# и авторы подгружаются по одному запросу на всю страницу.
+LIST_QUERIES = 5
+RETRIEVE_QUERIES = 4
+ANONYMOUS_LIST_QUERIES = 4
+ANONYMOUS_RETRIEVE_QUERIES = 3
+# Ответ на запись перечитывает рецепт так же, как retrieve; в тестах
+# транзакция записи видна как SAVEPOINT и RELEASE SAVEPOINT.
+CREATE_QUERIES = 12
+UPDATE_QUERIES = 14
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', (1, 5, 12))
+def test_recipe_list_queries(
+    user_client, recipes, django_assert_num_queries, limit
+):
+    with django_assert_num_queries(LIST_QUERIES):
+        response = user_client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    assert len(response.data['results']) == limit
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', (1, 5, 12))
+def test_anonymous_recipe_list_queries(
+    client, recipes, django_assert_num_queries, limit
+):
+    with django_assert_num_queries(ANONYMOUS_LIST_QUERIES):
+        response = client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    assert len(response.data['results']) == limit
+
+
+@pytest.mark.django_db
+def test_recipe_retrieve_queries(
+    user_client, recipes, django_assert_num_queries
+):
+    with django_assert_num_queries(RETRIEVE_QUERIES):
+        response = user_client.get(f'/api/recipes/{recipes[1].id}/')
+    assert response.status_code == 200
+    assert response.data['author']['is_subscribed'] is True
+    assert len(response.data['tags']) == 2
+    assert len(response.data['ingredients']) == 3
+
+
+@pytest.mark.django_db
+def test_anonymous_recipe_retrieve_queries(
+    client, recipes, django_assert_num_queries
+):
+    with django_assert_num_queries(ANONYMOUS_RETRIEVE_QUERIES):
+        response = client.get(f'/api/recipes/{recipes[1].id}/')
+    assert response.status_code == 200
+    assert response.data['author']['is_subscribed'] is False
+
+
+def recipe_data(tags, ingredients, amount=5):
+    return {
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'tags': [tag.id for tag in tags],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': amount}
+            for ingredient in ingredients
+        ],
+        'image': base64_png(),
+    }
+
+
+def make_ingredients(count):
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=f'Продукт {number}', measurement_unit='г')
+        for number in range(count)
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('count', (3, 30))
+def test_recipe_create_queries(
+    user_client, tags, media, django_assert_num_queries, count
+):
+    data = recipe_data(tags, make_ingredients(count))
+    with django_assert_num_queries(CREATE_QUERIES):
+        response = user_client.post('/api/recipes/', data, format='json')
+    assert response.status_code == 201, response.data
+    assert len(response.data['ingredients']) == count
+    assert response.data == user_client.get(
+        f'/api/recipes/{response.data["id"]}/'
+    ).data
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('count', (3, 30))
+def test_recipe_update_one_amount_queries(
+    user_client, tags, media, django_assert_num_queries, count
+):
+    data = recipe_data(tags, make_ingredients(count))
+    recipe_id = user_client.post('/api/recipes/', data, format='json').data[
+        'id'
+    ]
+    del data['image']
+    data['ingredients'][0]['amount'] = 7
+    with django_assert_num_queries(UPDATE_QUERIES):
+        response = user_client.patch(
+            f'/api/recipes/{recipe_id}/', data, format='json'
+        )
+    assert response.status_code == 200, response.data
+    assert response.data['ingredients'][0]['amount'] == 7
+    assert response.data == user_client.get(f'/api/recipes/{recipe_id}/').data
+
+
+@pytest.mark.django_db
+def test_recipe_create_is_atomic(
+    user_client, tags, ingredients, media, monkeypatch
+):
+    def fail(*args, **kwargs):
+        raise DatabaseError
+
+    monkeypatch.setattr(RecipeIngredient.objects, 'bulk_create', fail)
+    with pytest.raises(DatabaseError):
+        user_client.post(
+            '/api/recipes/', recipe_data(tags, ingredients), format='json'
+        )
+    assert not Recipe.objects.exists()
@@ -0,0 +1,65 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_unused_query_params_share_cache_entry(
+    client, ingredients, django_assert_num_queries
+):
+    response = client.get('/api/ingredients/', {'name': 'Инг'})
+    assert response.status_code == 200
+    with django_assert_num_queries(0):
+        cached = client.get(
+            '/api/ingredients/', {'name': 'Инг', 'junk': 'значение'}
+        )
+    assert cached.content == response.content
+    with django_assert_num_queries(1):
+        client.get('/api/ingredients/', {'name': 'Ингредиент 1'})
+
+
+@pytest.mark.django_db
+def test_cached_response_has_ttl(client, tags, settings, monkeypatch):
+    settings.REFERENCE_CACHE_TTL = 60
+    timeouts = []
+    set_entry = cache.set
+    monkeypatch.setattr(
+        cache, 'set',
+        lambda key, value, timeout=None: (
+            timeouts.append(timeout), set_entry(key, value, timeout)
+        )
+    )
+    response = client.get('/api/tags/')
+    assert response.status_code == 200
+    assert 60 in timeouts
+    not_modified = client.get(
+        '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+    )
+    assert not_modified.status_code == 304
+
+
+
+@pytest.mark.django_db
+def test_browsable_api_is_not_cached(
+    user, author, tags, django_assert_num_queries
+):
+    pages = []
+    for account in (user, author):
+        client = APIClient()
+        client.force_authenticate(account)
+        response = client.get('/api/tags/', HTTP_ACCEPT='text/html')
+        assert response.status_code == 200
+        pages.append(response.content.decode())
+    assert str(user) in pages[0]
+    assert str(author) in pages[1]
+    assert str(user) not in pages[1]
+    APIClient().get('/api/tags/')
+    with django_assert_num_queries(0):
+        assert APIClient().get('/api/tags/').status_code == 200
@@ -0,0 +1,211 @@
+import csv
+import io
+import re
+from collections import Counter
+
+import pytest
+from django.core.management import call_command
+from reportlab import rl_config
+
+from api.shopping_list import CSV_HEADER
+from recipes.models import (
+    Favorite, RecipeIngredient, ShoppingCart, ShoppingListItem
+)
+
+
+def stored_lists():
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount
+        in ShoppingListItem.objects.values_list(
+            'user_id', 'ingredient_id', 'amount'
+        )
+    }
+
+
+def assert_lists_match_carts():
+    assert stored_lists() == ShoppingListItem.calculate()
+    call_command('rebuild_shopping_lists', verify=True, stdout=None)
+
+
+@pytest.fixture
+def carts(user, author, recipes):
+    """Корзина user: рецепты обоих авторов."""
+    for recipe in recipes[:4]:
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+    ShoppingCart.objects.create(user=author, recipe=recipes[0])
+    assert_lists_match_carts()
+    return recipes[:4]
+
+
+@pytest.mark.django_db
+def test_author_deletion_cascades_to_lists(user, author, carts):
+    author.delete()
+    assert not ShoppingCart.objects.filter(recipe__author=author).exists()
+    assert_lists_match_carts()
+
+
+@pytest.mark.django_db
+def test_recipe_deletion_through_api(user_client, user, carts):
+    recipe = carts[0]
+    response = user_client.delete(f'/api/recipes/{recipe.id}/')
+    assert response.status_code == 204
+    assert_lists_match_carts()
+
+
+@pytest.mark.django_db
+def test_cart_recipe_change(user, carts, recipes):
+    # Так меняет рецепт list_editable в админке.
+    cart = ShoppingCart.objects.get(user=user, recipe=carts[0])
+    cart.recipe = recipes[5]
+    cart.save()
+    assert_lists_match_carts()
+    recipes[5].refresh_from_db()
+    assert recipes[5].in_carts_count == 1
+
+
+@pytest.mark.django_db
+def test_cart_queryset_delete(user, carts):
+    ShoppingCart.objects.filter(user=user).delete()
+    assert_lists_match_carts()
+
+
+@pytest.mark.django_db
+def test_recipe_ingredient_edits(carts, ingredients):
+    # Так меняет состав RecipeIngredientInline в админке.
+    recipe = carts[1]
+    row = recipe.ingredient_list.first()
+    row.amount += 5
+    row.save()
+    assert_lists_match_carts()
+    row.ingredient = ingredients[-1]
+    row.save()
+    assert_lists_match_carts()
+    RecipeIngredient.objects.create(
+        recipe=recipe, ingredient=ingredients[0], amount=7
+    )
+    assert_lists_match_carts()
+    row.delete()
+    assert_lists_match_carts()
+
+
+@pytest.mark.django_db
+def test_recipe_update_through_api(user_client, carts, tags, ingredients):
+    recipe = carts[0]
+    response = user_client.patch(f'/api/recipes/{recipe.id}/', {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'tags': [tag.id for tag in tags],
+        'ingredients': [
+            {'id': ingredients[0].id, 'amount': 5},
+            {'id': ingredients[-1].id, 'amount': 3},
+        ],
+    }, format='json')
+    assert response.status_code == 200, response.data
+    assert not recipe.ingredient_list.filter(
+        ingredient__in=ingredients[1:3]
+    ).exists()
+    assert_lists_match_carts()
+
+
+@pytest.mark.django_db
+def test_favorite_counter_follows_deletes(user, recipes):
+    Favorite.objects.create(user=user, recipe=recipes[1])
+    recipes[1].refresh_from_db()
+    assert recipes[1].favorites_count == 1
+    Favorite.objects.filter(user=user).delete()
+    recipes[1].refresh_from_db()
+    assert recipes[1].favorites_count == 0
+
+
+@pytest.mark.django_db
+def test_apply_adds_to_existing_rows(user, author, ingredients):
+    # Строку мог вставить параллельный запрос: повторная вставка
+    # прибавляет количество, а не падает на уникальном ограничении.
+    ingredient = ingredients[0]
+    for _ in range(2):
+        ShoppingListItem.apply([user.id, author.id], {ingredient.id: 5})
+    assert stored_lists() == {
+        (user.id, ingredient.id): 10, (author.id, ingredient.id): 10
+    }
+    ShoppingListItem.apply([user.id], {ingredient.id: -10})
+    ShoppingListItem.apply([author.id], {ingredient.id: -15})
+    assert stored_lists() == {}
+
+
+def cart_amounts(user):
+    """Количества по корзине, посчитанные по составу рецептов."""
+    amounts = Counter()
+    for row in RecipeIngredient.objects.filter(
+        recipe__shopping_carts__user=user
+    ).select_related('ingredient'):
+        amounts[
+            row.ingredient.name, row.ingredient.measurement_unit
+        ] += row.amount
+    return amounts
+
+
+def download(client, file_format=None):
+    params = {'format': file_format} if file_format else {}
+    return client.get('/api/recipes/download_shopping_cart/', params)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('file_format', (None, 'txt'))
+def test_download_txt(user_client, user, carts, file_format):
+    response = download(user_client, file_format)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/plain; charset=utf-8'
+    assert 'shopping_list.txt' in response['Content-Disposition']
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    amounts = Counter()
+    for line in lines:
+        name, rest = line.split('  - ')
+        amount, unit = rest.rstrip(')').split('(')
+        amounts[name, unit] += int(amount)
+    assert len(lines) == len(amounts)
+    assert amounts == cart_amounts(user)
+
+
+@pytest.mark.django_db
+def test_download_csv(user_client, user, carts):
+    response = download(user_client, 'csv')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/csv; charset=utf-8'
+    assert 'shopping_list.csv' in response['Content-Disposition']
+    header, *rows = csv.reader(io.StringIO(
+        b''.join(response.streaming_content).decode()
+    ))
+    assert header == list(CSV_HEADER)
+    assert Counter({
+        (name, unit): int(amount) for name, amount, unit in rows
+    }) == cart_amounts(user)
+
+
+@pytest.mark.django_db
+def test_download_pdf(user_client, user, carts, monkeypatch):
+    # Несжатые потоки страниц, чтобы найти в них количества.
+    monkeypatch.setattr(rl_config, 'pageCompression', 0)
+    response = download(user_client, 'pdf')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/pdf'
+    assert 'shopping_list.pdf' in response['Content-Disposition']
+    content = b''.join(response.streaming_content)
+    assert content.startswith(b'%PDF')
+    amounts = re.findall(rb'  - (\d+)\\\(', content)
+    assert sorted(map(int, amounts)) == sorted(
+        cart_amounts(user).values()
+    )
+
+
+@pytest.mark.django_db
+def test_download_unknown_format(user_client, carts):
+    response = download(user_client, 'docx')
+    assert response.status_code == 400
+    assert 'docx' in response.data
+
+
+@pytest.mark.django_db
+def test_download_requires_authentication(client, carts):
+    assert download(client).status_code == 401
@@ -0,0 +1,79 @@
+import pytest
+
+from conftest import make_user
+from recipes.models import Recipe
+from users.models import Subscription
+
+AUTHOR_RECIPES = 4
+# COUNT, страница авторов и рецепты всех авторов страницы.
+SUBSCRIPTIONS_QUERIES = 3
+
+
+@pytest.fixture
+def subscribe(django_user_model, user):
+    """Подписать user на count новых авторов с рецептами."""
+    def subscribe(count):
+        for number in range(count):
+            author = make_user(
+                django_user_model, f'author{Subscription.objects.count()}'
+            )
+            Subscription.objects.create(user=user, author=author)
+            for recipe_number in range(AUTHOR_RECIPES):
+                Recipe.objects.create(
+                    author=author,
+                    name=f'Рецепт {recipe_number}',
+                    text='Описание',
+                    cooking_time=10,
+                    image='recipes/test.png',
+                )
+    return subscribe
+
+
+def subscriptions(client, **params):
+    return client.get('/api/users/subscriptions/', params)
+
+
+@pytest.mark.django_db
+def test_recipes_limit_caps_recipes_per_author(user_client, subscribe):
+    subscribe(3)
+    response = subscriptions(user_client, recipes_limit=2)
+    assert response.status_code == 200
+    assert response.data['count'] == 3
+    for author in response.data['results']:
+        assert author['recipes_count'] == AUTHOR_RECIPES
+        assert [recipe['name'] for recipe in author['recipes']] == [
+            f'Рецепт {number}'
+            for number in range(AUTHOR_RECIPES - 1, AUTHOR_RECIPES - 3, -1)
+        ]
+
+
+@pytest.mark.django_db
+def test_without_recipes_limit_all_recipes(user_client, subscribe):
+    subscribe(2)
+    response = subscriptions(user_client)
+    for author in response.data['results']:
+        assert len(author['recipes']) == AUTHOR_RECIPES
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('authors', (1, 6))
+@pytest.mark.parametrize('recipes_limit', (None, 1, 3))
+def test_subscriptions_queries(
+    user_client, subscribe, django_assert_num_queries, authors,
+    recipes_limit
+):
+    subscribe(authors)
+    params = {'recipes_limit': recipes_limit} if recipes_limit else {}
+    with django_assert_num_queries(SUBSCRIPTIONS_QUERIES):
+        response = subscriptions(user_client, **params)
+    assert response.status_code == 200
+    assert len(response.data['results']) == authors
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('recipes_limit', ('0', '-1', 'abc', '1.5'))
+def test_invalid_recipes_limit(user_client, subscribe, recipes_limit):
+    subscribe(1)
+    response = subscriptions(user_client, recipes_limit=recipes_limit)
+    assert response.status_code == 400
+    assert 'recipes_limit' in response.data
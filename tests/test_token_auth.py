@@ -0,0 +1,113 @@
+import runpy
+
+import pytest
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import local_cache, shared_key
+
+
+@pytest.fixture(autouse=True)
+def shared_cache(settings):
+    settings.TOKEN_AUTH_CACHE = {**settings.TOKEN_AUTH_CACHE, 'ENABLED': True}
+    cache.clear()
+    local_cache._items.clear()
+    yield
+    local_cache._items.clear()
+
+
+@pytest.fixture
+def token(user):
+    return Token.objects.create(user=user)
+
+
+@pytest.fixture
+def token_client(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def me(client):
+    return client.get('/api/users/me/')
+
+
+def token_queries(queries):
+    return [
+        query for query in queries
+        if Token._meta.db_table in query['sql']
+        or 'users_customuser"."password' in query['sql']
+    ]
+
+
+@pytest.mark.django_db
+def test_shared_entry_has_no_user_data(token_client, token, user):
+    assert me(token_client).status_code == 200
+    entry = cache.get(shared_key(token.key))
+    assert set(entry) == {'user_id', 'is_active', 'version'}
+    assert entry['user_id'] == user.id
+    assert entry['is_active'] is True
+
+
+@pytest.mark.django_db
+def test_cached_token_skips_token_query(token_client):
+    me(token_client)
+    with CaptureQueriesContext(connection) as queries:
+        assert me(token_client).status_code == 200
+    assert not token_queries(queries)
+
+
+@pytest.mark.django_db
+def test_cache_is_disabled_by_default(settings, token_client, token):
+    settings.TOKEN_AUTH_CACHE = {
+        **settings.TOKEN_AUTH_CACHE, 'ENABLED': False
+    }
+    me(token_client)
+    with CaptureQueriesContext(connection) as queries:
+        assert me(token_client).status_code == 200
+    assert token_queries(queries)
+    assert cache.get(shared_key(token.key)) is None
+
+
+def test_cache_requires_redis(monkeypatch):
+    monkeypatch.setenv('TOKEN_AUTH_CACHE', 'True')
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    with pytest.raises(ImproperlyConfigured):
+        runpy.run_module('foodgram_backend.settings')
+
+
+@pytest.mark.django_db
+def test_queryset_deactivation_invalidates_token(token_client, user):
+    assert me(token_client).status_code == 200
+    type(user).objects.filter(pk=user.pk).update(is_active=False)
+    assert me(token_client).status_code == 401
+
+
+@pytest.mark.django_db
+def test_invalidation_in_another_process(token_client, token, user):
+    assert me(token_client).status_code == 200
+    # Другой процесс деактивировал пользователя и сбросил общую запись,
+    # локальная копия этого процесса осталась.
+    type(user).objects.filter(pk=user.pk).update(is_active=False)
+    cache.delete(shared_key(token.key))
+    assert me(token_client).status_code == 401
+
+
+@pytest.mark.django_db
+def test_new_version_reloads_user(token_client, token, user):
+    me(token_client)
+    type(user).objects.filter(pk=user.pk).update(first_name='Новое')
+    entry = cache.get(shared_key(token.key))
+    cache.set(shared_key(token.key), {**entry, 'version': 'other'})
+    assert me(token_client).data['first_name'] == 'Новое'
+
+
+@pytest.mark.django_db
+def test_logout_invalidates_token(token_client):
+    assert me(token_client).status_code == 200
+    assert token_client.post('/api/auth/token/logout/').status_code == 204
+    assert me(token_client).status_code == 401
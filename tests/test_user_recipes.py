@@ -0,0 +1,194 @@
+import io
+
+import pytest
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management import call_command
+
+from recipes import signals
+from recipes.models import (
+    Favorite, Recipe, ShoppingCart, ShoppingListItem
+)
+from test_shopping_list import assert_lists_match_carts
+
+# DELETE ... RETURNING, счётчик рецепта и SAVEPOINT/RELEASE теста.
+FAVORITE_DELETE_QUERIES = 4
+
+
+def counters(recipe):
+    recipe.refresh_from_db()
+    return recipe.favorites_count, recipe.in_carts_count
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('action, model', (
+    ('favorite', Favorite), ('shopping_cart', ShoppingCart)
+))
+def test_single_add_is_atomic(
+    user_client, recipes, monkeypatch, action, model
+):
+    # Счётчик рецепта не обновится: запись должна откатиться.
+    monkeypatch.setitem(signals.COUNTERS, model, 'unknown_count')
+    recipe = recipes[0]
+    with pytest.raises(FieldDoesNotExist):
+        user_client.post(f'/api/recipes/{recipe.id}/{action}/')
+    assert not model.objects.exists()
+
+
+@pytest.mark.django_db
+def test_single_delete_queries(
+    user_client, recipes, django_assert_num_queries
+):
+    recipe = recipes[0]
+    user_client.post(f'/api/recipes/{recipe.id}/favorite/')
+    assert counters(recipe) == (1, 0)
+    with django_assert_num_queries(FAVORITE_DELETE_QUERIES):
+        response = user_client.delete(f'/api/recipes/{recipe.id}/favorite/')
+    assert response.status_code == 204
+    assert counters(recipe) == (0, 0)
+    response = user_client.delete(f'/api/recipes/{recipe.id}/favorite/')
+    assert response.status_code == 400
+    assert counters(recipe) == (0, 0)
+
+
+@pytest.mark.django_db
+def test_single_cart_delete_updates_list(user_client, user, recipes):
+    recipe = recipes[0]
+    user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    assert counters(recipe) == (0, 1)
+    assert ShoppingListItem.objects.filter(user=user).exists()
+    response = user_client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+    assert response.status_code == 204
+    assert counters(recipe) == (0, 0)
+    assert not ShoppingCart.objects.filter(user=user).exists()
+    assert not ShoppingListItem.objects.filter(user=user).exists()
+    response = user_client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_single_delete_unknown_recipe(user_client, recipes):
+    assert user_client.delete('/api/recipes/0/favorite/').status_code == 400
+    assert user_client.delete('/api/recipes/abc/favorite/').status_code == 404
+    assert not Favorite.objects.exists()
+
+
+def all_counters():
+    return dict(Recipe.objects.values_list(
+        'id', 'favorites_count'
+    )), dict(Recipe.objects.values_list('id', 'in_carts_count'))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url, model', (
+    ('/api/recipes/favorite/', Favorite),
+    ('/api/recipes/shopping_cart/', ShoppingCart),
+))
+def test_bulk_add_and_remove(user_client, user, recipes, url, model):
+    ids = [recipe.id for recipe in recipes]
+    response = user_client.post(
+        url, {'recipes': [ids[0], ids[1], ids[0]]}, format='json'
+    )
+    assert response.status_code == 201
+    assert [recipe['id'] for recipe in response.data] == ids[:2]
+    # Уже добавленные рецепты не возвращаются и не считаются повторно.
+    response = user_client.post(
+        url, {'recipes': [ids[1], ids[2]]}, format='json'
+    )
+    assert response.status_code == 201
+    assert [recipe['id'] for recipe in response.data] == [ids[2]]
+    assert set(
+        model.objects.filter(user=user).values_list('recipe_id', flat=True)
+    ) == set(ids[:3])
+    response = user_client.delete(
+        url, {'recipes': [ids[0], ids[0], ids[3]]}, format='json'
+    )
+    assert response.status_code == 204
+    expected = {pk: int(pk in ids[1:3]) for pk in ids}
+    favorites, carts = all_counters()
+    assert (favorites if model is Favorite else carts) == expected
+    assert set((carts if model is Favorite else favorites).values()) == {0}
+    assert_lists_match_carts()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', (
+    '/api/recipes/favorite/', '/api/recipes/shopping_cart/'
+))
+@pytest.mark.parametrize('method', ('post', 'delete'))
+def test_bulk_unknown_recipes(user_client, recipes, url, method):
+    user_client.post(url, {'recipes': [recipes[0].id]}, format='json')
+    before = all_counters()
+    response = getattr(user_client, method)(
+        url, {'recipes': [recipes[0].id, 0, -1]}, format='json'
+    )
+    assert response.status_code == 400
+    assert all_counters() == before
+    assert_lists_match_carts()
+
+
+@pytest.mark.django_db
+def test_cart_delete_without_recipes_clears_cart(user_client, user, recipes):
+    ids = [recipe.id for recipe in recipes[:4]]
+    user_client.post(
+        '/api/recipes/shopping_cart/', {'recipes': ids}, format='json'
+    )
+    assert_lists_match_carts()
+    assert user_client.delete('/api/recipes/shopping_cart/').status_code == 204
+    assert not ShoppingCart.objects.filter(user=user).exists()
+    assert not ShoppingListItem.objects.filter(user=user).exists()
+    assert set(all_counters()[1].values()) == {0}
+
+
+def actual_counters():
+    return {
+        recipe.id: (
+            Favorite.objects.filter(recipe=recipe).count(),
+            ShoppingCart.objects.filter(recipe=recipe).count(),
+        )
+        for recipe in Recipe.objects.all()
+    }
+
+
+@pytest.fixture
+def marked(user, author, recipes):
+    """Избранное: recipes[3] у двоих, recipes[5] у одного; корзина."""
+    Favorite.objects.create(user=user, recipe=recipes[3])
+    Favorite.objects.create(user=author, recipe=recipes[3])
+    Favorite.objects.create(user=user, recipe=recipes[5])
+    ShoppingCart.objects.create(user=user, recipe=recipes[5])
+    return recipes
+
+
+@pytest.mark.django_db
+def test_reconcile_fixes_corrupted_counters(marked):
+    Recipe.objects.filter(id=marked[0].id).update(favorites_count=7)
+    Recipe.objects.filter(id=marked[3].id).update(favorites_count=0)
+    Recipe.objects.filter(id=marked[5].id).update(in_carts_count=5)
+    out = io.StringIO()
+    call_command('reconcile_recipe_counters', dry_run=True, stdout=out)
+    assert 'Рецептов с расхождениями: 3.' in out.getvalue()
+    assert counters(marked[0]) == (7, 0)
+    call_command('reconcile_recipe_counters', stdout=out)
+    assert {
+        recipe_id: (favorites, in_carts)
+        for recipe_id, favorites, in_carts in Recipe.objects.values_list(
+            'id', 'favorites_count', 'in_carts_count'
+        )
+    } == actual_counters()
+    out = io.StringIO()
+    call_command('reconcile_recipe_counters', stdout=out)
+    assert 'Рецептов с расхождениями: 0.' in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_ordering_by_favorites_count(client, marked):
+    response = client.get('/api/recipes/', {'ordering': '-favorites_count'})
+    assert response.status_code == 200
+    ids = [recipe['id'] for recipe in response.data['results']]
+    assert ids[:2] == [marked[3].id, marked[5].id]
+    response = client.get(
+        '/api/recipes/', {'ordering': 'favorites_count', 'limit': 20}
+    )
+    ids = [recipe['id'] for recipe in response.data['results']]
+    assert ids[-2:] == [marked[5].id, marked[3].id]
+    assert len(ids) == len(marked)